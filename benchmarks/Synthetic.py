@@ -0,0 +1,110 @@
+import os
+
+import numpy as np
+import soundfile as sf
+from PIL import Image, ImageDraw
+
+
+def click_track(path: str, duration: float, bpm: float = 120, sr: int = 22050, accent_every: int = 4,
+                block_seconds: float = 60.0) -> str:
+    """
+    Записывает метроном: короткие затухающие щелчки с частотой bpm, каждый accent_every-й громче.
+    Файл пишется блоками, поэтому длинные дорожки не держатся в памяти целиком.
+    Если файл уже существует, он не перезаписывается.
+
+    :param path: Путь к WAV-файлу.
+    :param duration: Длительность в секундах.
+    :param bpm: Темп в ударах в минуту.
+    :param sr: Частота дискретизации.
+    :param accent_every: Период акцента в ударах.
+    :param block_seconds: Длительность блока записи в секундах.
+    :return: Путь к файлу.
+    """
+    if os.path.exists(path):
+        return path
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    period = 60.0 / bpm
+    click_len = int(0.03 * sr)
+    t = np.arange(click_len) / sr
+    click = (np.sin(2 * np.pi * 1000 * t) * np.exp(-t * 150)).astype(np.float32)
+
+    total = int(duration * sr)
+    block = int(block_seconds * sr)
+    tmp_path = f'{path}.{os.getpid()}.tmp.wav'
+    with sf.SoundFile(tmp_path, 'w', samplerate=sr, channels=1, subtype='PCM_16', format='WAV') as f:
+        carry = np.zeros(click_len, dtype=np.float32)
+        for offset in range(0, total, block):
+            n = min(block, total - offset)
+            out = np.zeros(n + click_len, dtype=np.float32)
+            out[:click_len] += carry
+            # Удары, щелчок которых начинается внутри блока; хвост щелчка переходит в следующий блок
+            for beat in range(int(offset / sr / period), int((offset + n) / sr / period) + 2):
+                start = int(round(beat * period * sr)) - offset
+                if 0 <= start < n:
+                    gain = 0.9 if beat % accent_every == 0 else 0.4
+                    out[start:start + click_len] += gain * click
+            f.write(out[:n])
+            carry = out[n:]
+    os.replace(tmp_path, path)
+    return path
+
+
+def background(path: str, size: tuple[int, int] = (1280, 720)) -> str:
+    """
+    Записывает фоновое изображение с градиентом.
+
+    :param path: Путь к PNG-файлу.
+    :param size: Размер (ширина, высота).
+    :return: Путь к файлу.
+    """
+    if os.path.exists(path):
+        return path
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    w, h = size
+    x = np.linspace(0, 255, w, dtype=np.float32)[None, :]
+    y = np.linspace(0, 255, h, dtype=np.float32)[:, None]
+    img = np.stack([x + 0 * y, y + 0 * x, (x + y) / 2], axis=-1).astype(np.uint8)
+    Image.fromarray(img).save(path)
+    return path
+
+
+def sprite_png(path: str, size: tuple[int, int] = (400, 300), color: tuple = (220, 40, 40)) -> str:
+    """
+    Записывает изображение с прозрачностью: цветной эллипс на прозрачном поле.
+
+    :param path: Путь к PNG-файлу.
+    :param size: Размер (ширина, высота).
+    :param color: Цвет эллипса.
+    :return: Путь к файлу.
+    """
+    if os.path.exists(path):
+        return path
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    img = Image.new('RGBA', size, (0, 0, 0, 0))
+    ImageDraw.Draw(img).ellipse((0, 0, size[0] - 1, size[1] - 1), fill=(*color, 255))
+    img.save(path)
+    return path
+
+
+def sprite_gif(path: str, size: tuple[int, int] = (300, 300), n_frames: int = 8) -> str:
+    """
+    Записывает анимированный GIF: квадрат, движущийся по диагонали.
+
+    :param path: Путь к GIF-файлу.
+    :param size: Размер (ширина, высота).
+    :param n_frames: Количество кадров.
+    :return: Путь к файлу.
+    """
+    if os.path.exists(path):
+        return path
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    w, h = size
+    frames = []
+    for i in range(n_frames):
+        img = Image.new('RGB', size, (30, 30, 120))
+        x, y = i * (w // 2) // n_frames, i * (h // 2) // n_frames
+        ImageDraw.Draw(img).rectangle((x, y, x + w // 2, y + h // 2), fill=(250, 220, 40))
+        frames.append(img)
+    frames[0].save(path, save_all=True, append_images=frames[1:], duration=100, loop=0)
+    return path
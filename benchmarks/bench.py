@@ -0,0 +1,286 @@
+"""
+Бенчмарки этапов EViC maker на синтетических данных: анализ музыки по шагам, make_video,
+scale_clips, загрузка вставок, построение раскладки, сборка кадров и полный рендер,
+а также время холодного запуска (импорт модулей в новом процессе).
+
+Запуск из корня репозитория:
+
+    python -m benchmarks.bench                                  # короткий вход, сравнение с baseline.json
+    python -m benchmarks.bench --sizes short,10min,1h --output results.json
+    python -m benchmarks.bench --update-baseline                # записать текущие результаты как эталон
+
+Эталон зависит от машины, поэтому обновляйте его на той же машине, на которой сравниваете.
+При замедлении этапа больше допуска скрипт печатает список регрессий и завершается с кодом 1.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+import numpy as np
+
+from benchmarks.Synthetic import background, click_track, sprite_gif, sprite_png
+from tools.AudioSource import AudioSource
+from tools.FrameWriter import EncoderSettings
+from tools.Layout import Layout
+from tools.MusicAnalyzer import MusicAnalyzer
+from tools.Renderer import frame_times, render_video
+from tools.Schedule import build_schedule
+from tools.SpriteCache import SpriteCache
+from tools.VideoTools import make_video, scale_clips
+
+# Длительности входов в секундах
+SIZES = {'short': 30.0, '10min': 600.0, '1h': 3600.0}
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Команды холодного запуска, каждая выполняется в новом процессе интерпретатора.
+# import main задаёт каталог кэша numba, поэтому beat_tracking_ready измеряет загрузку кэша JIT
+STARTUP_COMMANDS = {
+    'startup.python': ['-c', 'pass'],
+    'startup.import_main': ['-c', 'import main'],
+    'startup.import_renderer': ['-c', 'import tools.Renderer'],
+    'startup.import_analyzer': ['-c', 'import tools.MusicAnalyzer'],
+    'startup.beat_tracking_ready': ['-c', 'import main, librosa.beat'],
+    'startup.cli_help': ['main.py', '--help'],
+}
+
+FPS = 24
+SENSITIVITY = 0.5
+SEED = 0
+
+
+@contextmanager
+def timed(results: dict[str, float], name: str) -> Iterator[None]:
+    """
+    Измеряет время выполнения блока и записывает его в results[name].
+
+    :param results: Словарь результатов в секундах.
+    :param name: Название этапа.
+    """
+    start = time.perf_counter()
+    yield
+    results[name] = time.perf_counter() - start
+
+
+def prepare_inputs(work_dir: str, duration: float, bpm: float = 120) -> dict:
+    """
+    Генерирует синтетические входные данные или берёт уже сгенерированные.
+
+    :param work_dir: Директория для входных данных.
+    :param duration: Длительность дорожки в секундах.
+    :param bpm: Темп метронома.
+    :return: Пути к аудио, фону и вставкам.
+    """
+    return {
+        'audio': click_track(os.path.join(work_dir, f'click_{int(duration)}s_{int(bpm)}bpm.wav'), duration, bpm),
+        'background': background(os.path.join(work_dir, 'background.png')),
+        'sprites': [
+            sprite_png(os.path.join(work_dir, 'red.png')),
+            sprite_png(os.path.join(work_dir, 'green.png'), (240, 320), (40, 200, 60)),
+            sprite_gif(os.path.join(work_dir, 'square.gif')),
+        ],
+    }
+
+
+def run_size(duration: float, work_dir: str, compose_frames: int = 240, render: bool = True) -> dict[str, float]:
+    """
+    Прогоняет все этапы на входе заданной длительности.
+
+    :param duration: Длительность дорожки в секундах.
+    :param work_dir: Директория для входных данных и временных файлов.
+    :param compose_frames: Количество подряд идущих кадров для замера сборки.
+    :param render: Выполнять ли полный рендер.
+    :return: Время этапов в секундах (для compose.frame_* — на один кадр).
+    """
+    inputs = prepare_inputs(work_dir, duration)
+    results: dict[str, float] = {}
+
+    analyzer = MusicAnalyzer(audio_path=inputs['audio'], log_file=os.path.join(work_dir, 'bench.log'))
+    with timed(results, 'analysis.load_audio'):
+        analyzer.load_audio()
+    with timed(results, 'analysis.compute_features'):
+        analyzer.compute_features()
+    with timed(results, 'analysis.detect_beats'):
+        analyzer.detect_beats()
+    with timed(results, 'analysis.calculate_beat_strengths'):
+        analyzer.calculate_beat_strengths()
+    with timed(results, 'analysis.build_beat_index'):
+        analyzer.build_beat_index()
+    results['analysis.process'] = sum(v for k, v in results.items() if k.startswith('analysis.'))
+
+    with timed(results, 'make_video'):
+        main_clip = make_video(inputs['background'], duration)
+        main_clip.get_frame(0)
+
+    with timed(results, 'scale_clips'):
+        clips = [make_video(path, 5) for path in inputs['sprites']]
+        for clip in scale_clips(main_clip, clips, 0.3):
+            clip.get_frame(0)
+
+    sprite_cache = SpriteCache(None)
+    with timed(results, 'sprites.load_scaled'):
+        sprites = sprite_cache.load_scaled(main_clip.size, inputs['sprites'], 0.3)
+
+    with timed(results, 'layout'):
+        top_beats = analyzer.beats.above_percentile(SENSITIVITY)
+        schedule = build_schedule(top_beats, main_clip.size, [sprite.size for sprite in sprites], seed=SEED)
+    layout = Layout(inputs['background'], inputs['sprites'], duration, schedule, sprite_scale=0.3, seed=SEED)
+
+    with timed(results, 'compose.build'):
+        compositor = layout.build_compositor(sprite_cache)
+    times = frame_times(duration, FPS)
+    middle = max(0, len(times) // 2 - compose_frames // 2)
+    per_frame = []
+    for t in times[middle:middle + compose_frames]:
+        start = time.perf_counter()
+        compositor.make_frame(t)
+        per_frame.append(time.perf_counter() - start)
+    results['compose.frame_mean'] = float(np.mean(per_frame))
+    results['compose.frame_p95'] = float(np.percentile(per_frame, 95))
+
+    if render:
+        out_dir = tempfile.mkdtemp(prefix='bench_', dir=work_dir)
+        try:
+            with timed(results, 'end_to_end'):
+                audio = AudioSource(inputs['audio'])
+                analyzer = MusicAnalyzer(audio_path=audio.path, log_file=os.path.join(work_dir, 'bench.log'),
+                                         source=audio)
+                analyzer.process()
+                audio.release()
+                top_beats = analyzer.beats.above_percentile(SENSITIVITY)
+                schedule = build_schedule(top_beats, main_clip.size, [sprite.size for sprite in sprites], seed=SEED)
+                layout = Layout(inputs['background'], inputs['sprites'], analyzer.get_audio_duration(), schedule,
+                                sprite_scale=0.3, seed=SEED)
+                render_video(layout.build_compositor(SpriteCache(None)).to_clip(), os.path.join(out_dir, 'out.mp4'),
+                             fps=FPS, audio=audio, encoder=EncoderSettings(preset='ultrafast'))
+        finally:
+            shutil.rmtree(out_dir, ignore_errors=True)
+    return results
+
+
+def startup_times(repeats: int = 3) -> dict[str, float]:
+    """
+    Измеряет время холодного запуска: каждая команда из STARTUP_COMMANDS выполняется
+    repeats раз в новом процессе, берётся медиана.
+
+    :param repeats: Количество повторов каждой команды.
+    :return: Время команд в секундах.
+    """
+    results = {}
+    for name, args in STARTUP_COMMANDS.items():
+        samples = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, *args], cwd=REPO_ROOT, check=True, stdout=subprocess.DEVNULL)
+            samples.append(time.perf_counter() - start)
+        results[name] = float(np.median(samples))
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float, min_delta: float) -> list[str]:
+    """
+    Сравнивает результаты с эталоном.
+
+    :param results: Результаты по входам: {вход: {этап: секунды}}.
+    :param baseline: Эталон в том же формате.
+    :param tolerance: Допустимое относительное замедление, например 0.25 — на 25%.
+    :param min_delta: Замедление в секундах, меньше которого отклонение считается шумом.
+    :return: Описания регрессий.
+    """
+    regressions = []
+    for size, stages in results.items():
+        for stage, value in stages.items():
+            base = baseline.get(size, {}).get(stage)
+            if base is None:
+                continue
+            delta = min_delta / FPS if stage.startswith('compose.frame') else min_delta
+            if value > base * (1 + tolerance) and value - base > delta:
+                regressions.append(f'{size} {stage}: {value:.4f} с против {base:.4f} с (x{value / base:.2f})')
+    return regressions
+
+
+def environment() -> dict:
+    """Описание машины и версий, на которых получены результаты."""
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Бенчмарки этапов EViC maker')
+    parser.add_argument('--sizes', default='short', help=f"Входы через запятую: {', '.join(SIZES)}")
+    parser.add_argument('--work-dir', default='cache/bench', help='Директория для синтетических данных')
+    parser.add_argument('--output', default=None, help='Путь к JSON с результатами')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='Путь к эталону')
+    parser.add_argument('--update-baseline', action='store_true', help='Записать результаты в эталон')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Допустимое относительное замедление')
+    parser.add_argument('--min-delta', type=float, default=0.05,
+                        help='Замедление в секундах, которое считается шумом')
+    parser.add_argument('--compose-frames', type=int, default=240, help='Количество кадров для замера сборки')
+    parser.add_argument('--no-render', action='store_true', help='Не выполнять полный рендер')
+    parser.add_argument('--startup-repeats', type=int, default=3,
+                        help='Повторы замера холодного запуска (0 — не замерять)')
+    args = parser.parse_args(argv)
+
+    sizes = [s.strip() for s in args.sizes.split(',') if s.strip()]
+    unknown = [s for s in sizes if s not in SIZES]
+    if unknown:
+        parser.error(f"Неизвестные входы: {', '.join(unknown)}")
+
+    os.makedirs(args.work_dir, exist_ok=True)
+    results = {}
+    if args.startup_repeats > 0:
+        print('Бенчмарк запуска...')
+        results['startup'] = startup_times(args.startup_repeats)
+        for stage, value in results['startup'].items():
+            print(f'  {stage:<36} {value:10.4f} с')
+    for size in sizes:
+        print(f'Бенчмарк {size}...')
+        results[size] = run_size(SIZES[size], args.work_dir, args.compose_frames, not args.no_render)
+        for stage, value in results[size].items():
+            print(f'  {stage:<36} {value:10.4f} с')
+
+    report = {'environment': environment(), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f).get('results', {})
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump({'environment': environment(), 'results': baseline}, f, indent=2)
+        print(f'Эталон обновлён: {args.baseline}')
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print('Эталон не найден, сравнение пропущено')
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)['results']
+    regressions = compare(results, baseline, args.tolerance, args.min_delta)
+    if regressions:
+        print('РЕГРЕССИИ ПРОИЗВОДИТЕЛЬНОСТИ:')
+        for line in regressions:
+            print(f'  {line}')
+        return 1
+    print('Регрессий нет')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""
+Проверка и бенчмарк смешивания слоёв (tools.Blend) при 1080p и 4K.
+
+Сравнивает три способа наложения полупрозрачного слоя на кадр:
+    float  — прежний путь: маска float от 0 до 1 и blit_array в float;
+    numpy  — целочисленное смешивание blend_numpy;
+    numba  — JIT-ядро blend.
+Перед замером проверяется, что numba и numpy совпадают бит в бит, а от float результат
+отличается не больше чем на 1, в том числе для слоёв, обрезанных краями кадра. Граница относится
+только к прежнему пути float с той же маской uint8: от композиции moviepy с исходной маской PNG
+результат отличается до 2, потому что маска квантуется при загрузке вставок.
+
+Запуск из корня репозитория:
+
+    python -m benchmarks.blend
+    python -m benchmarks.blend --repeats 50
+
+При расхождении результатов скрипт завершается с кодом 1.
+"""
+import argparse
+import os
+import sys
+import time
+from typing import Callable, Optional
+
+# Кэш numba тот же, что у main.py
+os.environ.setdefault('NUMBA_CACHE_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                      'cache', 'numba'))
+
+import numpy as np
+
+from tools.Blend import blend, blend_numpy
+from tools.Compositor import blit_array
+
+# Размеры кадра (ширина, высота)
+FRAME_SIZES = {'1080p': (1920, 1080), '4k': (3840, 2160)}
+# Доля большей стороны кадра, которую занимает слой, как у вставок с масштабом 0.3
+LAYER_SCALE = 0.3
+
+
+def make_layer(rng: np.random.Generator, w: int, h: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Случайный слой с альфа-каналом, похожим на PNG со сглаженными краями:
+    примерно 40% прозрачных, 40% непрозрачных и 20% полупрозрачных пикселей.
+
+    :param rng: Генератор случайных чисел.
+    :param w: Ширина слоя.
+    :param h: Высота слоя.
+    :return: Изображение (h, w, 3) и альфа-канал (h, w) uint8.
+    """
+    img = rng.integers(0, 256, (h, w, 3), dtype=np.uint8)
+    kind = rng.random((h, w))
+    alpha = np.where(kind < 0.4, 0, np.where(kind < 0.8, 255, rng.integers(1, 255, (h, w)))).astype(np.uint8)
+    return img, alpha
+
+
+def blend_float(frame: np.ndarray, img: np.ndarray, x: int, y: int, alpha: np.ndarray) -> None:
+    """Прежний путь Compositor: маска float на каждый кадр и смешивание в float."""
+    blit_array(frame, img, x, y, alpha / 255.0)
+
+
+def blend_int(frame: np.ndarray, img: np.ndarray, x: int, y: int, alpha: np.ndarray) -> None:
+    """blend с ядром blend_numpy вместо numba."""
+    fh, fw = frame.shape[:2]
+    ih, iw = img.shape[:2]
+    x1, y1 = max(0, -x), max(0, -y)
+    x2, y2 = min(iw, fw - x), min(ih, fh - y)
+    if x1 < x2 and y1 < y2:
+        blend_numpy(frame[y + y1:y + y2, x + x1:x + x2], img[y1:y2, x1:x2], alpha[y1:y2, x1:x2])
+
+
+METHODS: dict[str, Callable] = {'float': blend_float, 'numpy': blend_int, 'numba': blend}
+
+
+def check(rng: np.random.Generator, cases: int = 200) -> list[str]:
+    """
+    Сравнивает способы смешивания на случайных слоях и позициях, включая выход за края кадра.
+
+    :param rng: Генератор случайных чисел.
+    :param cases: Количество случаев.
+    :return: Описания расхождений.
+    """
+    errors = []
+    for case in range(cases):
+        fw, fh = int(rng.integers(8, 200)), int(rng.integers(8, 200))
+        iw, ih = int(rng.integers(1, 120)), int(rng.integers(1, 120))
+        x, y = int(rng.integers(-iw, fw + 1)), int(rng.integers(-ih, fh + 1))
+        img, alpha = make_layer(rng, iw, ih)
+        base = rng.integers(0, 256, (fh, fw, 3), dtype=np.uint8)
+        results = {}
+        for name, method in METHODS.items():
+            frame = base.copy()
+            method(frame, img, x, y, alpha)
+            results[name] = frame.astype(np.int16)
+        if not np.array_equal(results['numba'], results['numpy']):
+            errors.append(f'случай {case}: numba и numpy расходятся')
+        diff = int(np.abs(results['numba'] - results['float']).max())
+        if diff > 1:
+            errors.append(f'случай {case}: отличие от float {diff}')
+    return errors
+
+
+def time_layer(method: Callable, frame: np.ndarray, img: np.ndarray, alpha: np.ndarray, x: int, y: int,
+               repeats: int) -> float:
+    """
+    Медианное время наложения одного слоя.
+
+    :return: Время в секундах.
+    """
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        method(frame, img, x, y, alpha)
+        samples.append(time.perf_counter() - start)
+    return float(np.median(samples))
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Проверка и бенчмарк смешивания слоёв')
+    parser.add_argument('--repeats', type=int, default=20, help='Повторы замера каждого слоя')
+    args = parser.parse_args(argv)
+    rng = np.random.default_rng(0)
+
+    start = time.perf_counter()
+    blend(np.zeros((1, 1, 3), np.uint8), np.zeros((1, 1, 3), np.uint8), 0, 0, np.full((1, 1), 128, np.uint8))
+    print(f'Загрузка ядра numba: {time.perf_counter() - start:.3f} с')
+
+    errors = check(rng)
+    if errors:
+        print('РАСХОЖДЕНИЯ:')
+        for line in errors[:20]:
+            print(f'  {line}')
+        return 1
+    print('Проверка: numba совпадает с numpy, отличие от float не больше 1')
+
+    print(f"{'кадр':<6} {'слой':<10} {'позиция':<8}" + ''.join(f'{name:>12}' for name in METHODS))
+    for label, (fw, fh) in FRAME_SIZES.items():
+        side = int(max(fw, fh) * LAYER_SCALE)
+        layers = {f'{min(side, fw)}x{min(side, fh)}': make_layer(rng, min(side, fw), min(side, fh)),
+                  f'{fw}x{fh}': make_layer(rng, fw, fh)}
+        for layer, (img, alpha) in layers.items():
+            ih, iw = alpha.shape
+            # Внутри кадра и наполовину за правым нижним краем
+            for position, (x, y) in {'центр': ((fw - iw) // 2, (fh - ih) // 2),
+                                     'край': (fw - iw // 2, fh - ih // 2)}.items():
+                frame = rng.integers(0, 256, (fh, fw, 3), dtype=np.uint8)
+                times = [time_layer(method, frame, img, alpha, x, y, args.repeats) for method in METHODS.values()]
+                print(f'{label:<6} {layer:<10} {position:<8}' + ''.join(f'{t * 1000:10.2f}мс' for t in times))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""
+Проверка инкрементального рендера: какая доля отрезков переиспользуется после небольшого
+изменения чувствительности. Биты синтетического трека выбираются при базовой чувствительности
+и при соседних значениях, для каждой раскладки строятся ключи отрезков (segment_signatures)
+и сравниваются с ключами базовой раскладки. Рендер не выполняется.
+
+Переиспользовать можно только отрезки, в которых не появляются и не исчезают биты, поэтому при
+большом изменении доля падает: при 0.8 -> 0.85 уходит четверть битов и остаётся около трети отрезков.
+
+Запуск из корня репозитория:
+
+    python -m benchmarks.reuse
+    python -m benchmarks.reuse --duration 3600 --variants 0.78,0.79,0.81,0.82
+
+Если доля переиспользованных отрезков для какого-либо варианта меньше --min-reuse,
+скрипт завершается с кодом 1.
+"""
+import argparse
+import os
+import sys
+import tempfile
+from typing import Optional
+
+import numpy as np
+
+from benchmarks.Synthetic import background, sprite_png
+from tools.BeatIndex import BeatIndex
+from tools.Layout import Layout
+from tools.Renderer import segment_signatures
+from tools.Schedule import build_schedule
+
+# Размер кадра и вставок синтетической раскладки
+FRAME_SIZE = (1280, 720)
+SPRITE_SIZES = [(216, 216), (384, 216), (160, 216)]
+
+
+def synthetic_beats(duration: float, rng: np.random.Generator) -> BeatIndex:
+    """
+    Биты с темпом около 120 ударов в минуту и случайной силой.
+
+    :param duration: Длительность трека в секундах.
+    :param rng: Генератор случайных чисел.
+    :return: Индекс битов.
+    """
+    times = np.cumsum(rng.uniform(0.4, 0.6, int(duration / 0.5)))
+    times = times[times < duration]
+    return BeatIndex(times, rng.random(len(times)))
+
+
+def reuse_fraction(base: list[str], other: list[str]) -> float:
+    """
+    Доля отрезков раскладки other, ключи которых есть среди ключей base.
+
+    :param base: Ключи отрезков предыдущего рендера.
+    :param other: Ключи отрезков нового рендера.
+    :return: Доля от 0 до 1.
+    """
+    cached = set(base)
+    return sum(signature in cached for signature in other) / len(other)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Доля переиспользованных отрезков при изменении чувствительности')
+    parser.add_argument('--duration', type=float, default=600.0, help='Длительность трека в секундах')
+    parser.add_argument('--sensitivity', type=float, default=0.8, help='Базовая чувствительность')
+    parser.add_argument('--variants', default='0.79,0.81', help='Чувствительности для сравнения через запятую')
+    parser.add_argument('--fps', type=int, default=24, help='Частота кадров')
+    parser.add_argument('--segment', type=float, default=2.0, help='Длительность отрезка в секундах')
+    parser.add_argument('--seed', type=int, default=0, help='Зерно раскладки')
+    parser.add_argument('--min-reuse', type=float, default=0.7,
+                        help='Минимальная доля переиспользованных отрезков (по умолчанию 0.7)')
+    args = parser.parse_args(argv)
+
+    beats = synthetic_beats(args.duration, np.random.default_rng(0))
+    segment_frames = max(1, round(args.segment * args.fps))
+    with tempfile.TemporaryDirectory() as tmp:
+        background_path = background(os.path.join(tmp, 'background.png'), FRAME_SIZE)
+        sprite_paths = [sprite_png(os.path.join(tmp, f'sprite{i}.png'), size) for i, size in enumerate(SPRITE_SIZES)]
+
+        def signatures(sensitivity: float) -> list[str]:
+            schedule = build_schedule(beats.above_percentile(sensitivity), FRAME_SIZE, SPRITE_SIZES, seed=args.seed)
+            layout = Layout(background_path, sprite_paths, args.duration, schedule, seed=args.seed)
+            return segment_signatures(layout, args.fps, segment_frames)[0]
+
+        base = signatures(args.sensitivity)
+        print(f'Отрезков: {len(base)}, битов: {len(beats.above_percentile(args.sensitivity))} '
+              f'при чувствительности {args.sensitivity}')
+        failed = False
+        for sensitivity in [float(value) for value in args.variants.split(',')]:
+            fraction = reuse_fraction(base, signatures(sensitivity))
+            below = fraction < args.min_reuse
+            failed |= below
+            print(f'  {sensitivity:<6} переиспользовано {fraction:6.1%}' + ('  НИЖЕ ПОРОГА' if below else ''))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
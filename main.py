@@ -1,61 +1,116 @@
-import random as rnd
+import argparse
+import os
 
-from audiofile import duration
-from moviepy.audio.io.AudioFileClip import AudioFileClip
-from tqdm import tqdm
+# Кэш JIT-компиляции numba (librosa) в каталоге проекта: повторные запуски загружают скомпилированный код,
+# даже если каталог установки librosa недоступен для записи. Задаётся до первого импорта numba
+os.environ.setdefault('NUMBA_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'numba'))
 
-from tools.MusicAnalyzer import MusicAnalyzer
-from tools.VideoTools import make_video, insert_image_clip, scale_clips, insert_image_clip_random
-from moviepy.editor import VideoFileClip, VideoClip, ImageClip, CompositeVideoClip
+from moviepy.video.VideoClip import VideoClip
 
+from tools.AnalysisCache import AnalysisCache
+from tools.AudioSource import AudioSource
+from tools.Batch import load_manifest, run_batch
+from tools.FrameWriter import EncoderSettings
+from tools.Layout import Layout
+from tools.LayoutBuilder import analyze_audio, create_layout as build_layout
+from tools.Profiler import PROFILE_ENV, PROFILE_MEMORY_ENV, Profiler, get_profiler, profiler_from_env, set_profiler
+from tools.Renderer import render_video, render_parallel, render_preview, render_incremental
+from tools.SpriteCache import SpriteCache
 
-def analyze_music_and_add_images(backstage_path: str, images_path: list[str], music_path: str, sensitivity: float) -> VideoFileClip:
+
+def create_layout(backstage_path: str, images_path: list[str], audio: AudioSource, sensitivity: float,
+                  seed: int | None = None, sprite_cache: SpriteCache | None = None,
+                  effects: list[int] | None = None) -> Layout:
     print('Анализ музыкального файла...')
+    analyzer = analyze_audio(audio, AnalysisCache())
 
-    analyzer = MusicAnalyzer(audio_path=music_path, log_file='logs/music_handler.log')
-    analyzer.process()
+    print('Размещение дочерних клипов...')
+    return build_layout(backstage_path, images_path, analyzer, sensitivity, seed, effects, sprite_cache)
 
-    top_beats = analyzer.get_strong_beats_above_threshold(sensitivity)
-    max_strength_percent = top_beats['Strength'].max() / 100
 
-    print('Создание главного клипа...')
-    main_clip = make_video(backstage_path, analyzer.get_audio_duration())
+def analyze_music_and_add_images(backstage_path: str, images_path: list[str], audio: AudioSource,
+                                 sensitivity: float, seed: int | None = None,
+                                 effects: list[int] | None = None) -> VideoClip:
+    sprite_cache = SpriteCache()
+    layout = create_layout(backstage_path, images_path, audio, sensitivity, seed, sprite_cache, effects)
 
-    print('Создание дочерних клипов...')
-    image_clips = scale_clips(main_clip, [make_video(img, 5) for img in images_path], 0.3)
+    print('Создание итогового клипа...')
+    return layout.build_compositor(sprite_cache).to_clip()
 
-    print('Добавление дочерних клипов в видео...')
-    accumulated_clips = []  # Список для накопления всех вставляемых клипов
 
-    percentile_30 = top_beats['Strength'].quantile(.3)
-    percentile_70 = top_beats['Strength'].quantile(.7)
+def batch(manifest_path: str, state_path: str, workers: int, encoder: EncoderSettings) -> bool:
+    jobs = load_manifest(manifest_path)
+    print(f'Пакетный рендер: {len(jobs)} заданий, процессов: {workers}')
 
-    for time, strength in tqdm(top_beats.to_numpy(), desc="Добавление клипов по битам"):
-        if strength < percentile_30:
-            count = 1
-        elif strength < percentile_70:
-            count = 2
+    def report(job, entry: dict) -> None:
+        if entry.get('skipped'):
+            print(f'  {job.output}: уже готов, пропущен')
+        elif 'error' in entry:
+            print(f"  {job.output}: ошибка — {entry['error']}")
         else:
-            count = 3
-
-        for _ in range(count):
-            chosen_clip = rnd.choice(image_clips)
-            new_clip = insert_image_clip_random(main_clip, chosen_clip, time, time + 2 + count)
-            accumulated_clips.append(new_clip)
-
-    print('Создание итогового CompositeVideoClip...')
-    final_clip = CompositeVideoClip([main_clip] + accumulated_clips)
-
-    print('Добавляем аудио...')
-    audio_clip = AudioFileClip(music_path).subclip(0, final_clip.duration)
-    final_clip = final_clip.set_audio(audio_clip)
+            stages = ', '.join(f'{name} {seconds:.1f} с' for name, seconds in entry['stages'].items())
+            print(f"  {job.output}: {entry['seconds']:.1f} с ({stages})")
 
-    return final_clip
+    results = run_batch(jobs, state_path, workers=workers, fps=24, encoder=encoder, report=report)
+    failed = sum('error' in entry for entry in results.values())
+    print(f'Готово: {len(results) - failed} из {len(jobs)}, состояние: {state_path}')
+    return not failed
 
 
+def save_profile(profile_path: str | None) -> None:
+    if profile_path:
+        profiler = get_profiler()
+        profiler.stop()
+        print(f"Профиль сохранён: {', '.join(profiler.save(profile_path))}")
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='EViC maker — создание клипа под музыку')
+    parser.add_argument('--workers', type=int, default=1, help='Количество процессов для рендера')
+    parser.add_argument('--seed', type=int, default=None, help='Зерно генератора случайной раскладки')
+    parser.add_argument('--output', default='output.mp4', help='Путь к итоговому файлу')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Переиспользовать неизменившиеся отрезки предыдущих рендеров')
+    parser.add_argument('--preview', action='store_true', help='Быстрый черновик в уменьшенном разрешении')
+    parser.add_argument('--preview-scale', type=float, default=0.25, help='Масштаб кадра черновика')
+    parser.add_argument('--preview-fps', type=int, default=12, help='Частота кадров черновика')
+    parser.add_argument('--start', type=float, default=0.0, help='Начало фрагмента черновика в секундах')
+    parser.add_argument('--end', type=float, default=None, help='Конец фрагмента черновика в секундах')
+    parser.add_argument('--preset', default=None,
+                        help='Пресет кодировщика libx264 (по умолчанию medium, для черновика ultrafast)')
+    parser.add_argument('--threads', type=int, default=None, help='Количество потоков кодировщика')
+    parser.add_argument('--pix-fmt', default=None, help='Формат пикселей итогового видео (по умолчанию yuv420p)')
+    parser.add_argument('--stream', action='store_true',
+                        help='Писать фрагментированный MP4 (HLS для .m3u8), который можно смотреть до конца рендера')
+    parser.add_argument('--profile', default=None,
+                        help=f'Сохранить профиль этапов и кадров: PATH.json и PATH.trace.json (или ${PROFILE_ENV})')
+    parser.add_argument('--profile-sample', type=float, default=None,
+                        help='Интервал семплирующего профилировщика в секундах (стеки в PATH.samples.txt)')
+    parser.add_argument('--profile-memory', action='store_true',
+                        help='Измерять пиковую память этапов через tracemalloc, замедляет рендер '
+                             f'(или ${PROFILE_MEMORY_ENV}=1)')
+    parser.add_argument('--layout', default=None, help='Рендерить сохранённую раскладку вместо анализа музыки')
+    parser.add_argument('--save-layout', default=None, help='Сохранить раскладку в файл .npz')
+    parser.add_argument('--batch', default=None,
+                        help='Пакетный рендер по манифесту заданий JSON (--workers задаёт размер пула)')
+    parser.add_argument('--batch-state', default=None,
+                        help='Файл состояния пакетного рендера (по умолчанию MANIFEST.state.json)')
+    args = parser.parse_args()
+    if args.stream and (args.workers > 1 or args.incremental):
+        parser.error('--stream несовместим с --workers > 1 и --incremental')
+
+    profile_path = args.profile
+    if profile_path:
+        set_profiler(Profiler(track_memory=args.profile_memory, sample_interval=args.profile_sample))
+    else:
+        profile_path = profiler_from_env()
+
+    if args.batch:
+        ok = batch(args.batch, args.batch_state or f'{args.batch}.state.json', args.workers,
+                   EncoderSettings(args.preset or 'medium', args.threads, args.pix_fmt))
+        save_profile(profile_path)
+        raise SystemExit(0 if ok else 1)
+
     test_paths = [
     "data/test_dump/cd.png",
     # "data/test_dump/computer.gif",
@@ -65,15 +120,39 @@ if __name__ == "__main__":
     "data/test_dump/warning.png"
     ]
 
-    res = analyze_music_and_add_images(
-        'data/test_dump/background.png',
-        test_paths,
-        'data/test_dump/test.mp3',
-        0.80
-    )
+    audio = AudioSource('data/test_dump/test.mp3')
+    sprite_cache = SpriteCache()
+    if args.layout:
+        layout = Layout.load(args.layout)
+    else:
+        layout = create_layout(
+            'data/test_dump/background.png',
+            test_paths,
+            audio,
+            0.80,
+            args.seed,
+            sprite_cache
+        )
+    if args.save_layout:
+        layout.save(args.save_layout)
 
     print('Сохранение файла...')
-    res.write_videofile("output.mp4", fps=24)
+    if args.preview:
+        encoder = EncoderSettings(args.preset or 'ultrafast', args.threads, args.pix_fmt, streaming=args.stream)
+        render_preview(layout, args.output, scale=args.preview_scale, fps=args.preview_fps, start=args.start,
+                       end=args.end, audio=audio, sprite_cache=sprite_cache, encoder=encoder)
+    else:
+        encoder = EncoderSettings(args.preset or 'medium', args.threads, args.pix_fmt, streaming=args.stream)
+        if args.incremental:
+            render_incremental(layout, args.output, fps=24, audio=audio, workers=args.workers,
+                               sprite_cache=sprite_cache, encoder=encoder)
+        elif args.workers > 1:
+            render_parallel(layout, args.output, fps=24, audio=audio, workers=args.workers, encoder=encoder)
+        else:
+            render_video(layout.build_compositor(sprite_cache).to_clip(), args.output, fps=24, audio=audio,
+                         encoder=encoder)
+
+    save_profile(profile_path)
 
     # video = make_video('data/test_dump/background.png', 15)
     # # clip = ImageClip('/home/rokoko/Desktop/dreamlady.webp')
@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+from typing import Optional
+
+import numpy as np
+
+# Версия формата записей. Увеличивается при изменении алгоритма анализа,
+# чтобы старые результаты не подхватывались из кэша.
+CACHE_VERSION = 4
+
+
+class AnalysisCache:
+    """
+    Дисковый кэш результатов MusicAnalyzer.
+    Ключ записи строится по содержимому аудиофайла и параметрам анализа,
+    значения хранятся в бинарном формате .npz. Общий размер кэша ограничен,
+    при превышении удаляются записи, к которым дольше всего не обращались (LRU).
+    """
+
+    # Окончание имён файлов записей
+    suffix: str = '.npz'
+
+    def __init__(self, cache_dir: str = 'cache/analysis', max_bytes: int = 256 * 1024 * 1024) -> None:
+        """
+        Инициализация кэша.
+
+        :param cache_dir: Директория для хранения записей.
+        :param max_bytes: Максимальный суммарный размер записей в байтах (по умолчанию 256 МБ).
+        """
+        self.cache_dir: str = cache_dir
+        self.max_bytes: int = max_bytes
+        # Хэши уже прочитанных файлов: (путь, размер, время изменения) -> хэш содержимого
+        self._file_hashes: dict[tuple[str, int, int], str] = {}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def file_hash(self, path: str) -> str:
+        """
+        Вычисляет хэш содержимого файла. Повторные вызовы для неизменённого файла не читают его заново.
+
+        :param path: Путь к файлу.
+        :return: Шестнадцатеричный хэш содержимого.
+        """
+        stat = os.stat(path)
+        memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        if memo_key not in self._file_hashes:
+            with open(path, 'rb') as f:
+                self._file_hashes[memo_key] = hashlib.file_digest(f, 'blake2b').hexdigest()
+        return self._file_hashes[memo_key]
+
+    def make_key(self, audio_path: str, **params) -> str:
+        """
+        Строит ключ записи по содержимому аудиофайла и параметрам анализа.
+
+        :param audio_path: Путь к аудиофайлу.
+        :param params: Параметры анализа (frame_length, hop_length, strength_window, sr и т.д.).
+        :return: Ключ записи.
+        """
+        description = json.dumps({'version': CACHE_VERSION, 'file': self.file_hash(audio_path), **params},
+                                 sort_keys=True)
+        return hashlib.blake2b(description.encode(), digest_size=20).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f'{key}{self.suffix}')
+
+    def load(self, key: str) -> Optional[dict[str, np.ndarray]]:
+        """
+        Загружает запись из кэша и отмечает её как недавно использованную.
+
+        :param key: Ключ записи.
+        :return: Словарь массивов или None, если записи нет или она повреждена.
+        """
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                result = {name: data[name] for name in data.files}
+        except (OSError, ValueError):
+            return None
+        os.utime(path)
+        return result
+
+    def save(self, key: str, data: dict[str, np.ndarray]) -> None:
+        """
+        Сохраняет запись в кэш и при необходимости вытесняет старые записи.
+
+        :param key: Ключ записи.
+        :param data: Словарь массивов для сохранения.
+        """
+        path = self._path(key)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **data)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self) -> None:
+        """
+        Удаляет наиболее давно использованные записи, пока размер кэша превышает max_bytes.
+        """
+        evict_lru(self.cache_dir, self.max_bytes, self.suffix)
+
+
+def evict_lru(cache_dir: str, max_bytes: int, suffix: str) -> None:
+    """
+    Удаляет из директории файлы с заданным окончанием, начиная с наиболее давно
+    использованных (по времени изменения), пока их суммарный размер превышает max_bytes.
+
+    :param cache_dir: Директория кэша.
+    :param max_bytes: Максимальный суммарный размер файлов в байтах.
+    :param suffix: Окончание имён файлов записей.
+    """
+    entries = []
+    for name in os.listdir(cache_dir):
+        if not name.endswith(suffix):
+            continue
+        try:
+            stat = os.stat(os.path.join(cache_dir, name))
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, name))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(os.path.join(cache_dir, name))
+        except FileNotFoundError:
+            pass
+        total -= size
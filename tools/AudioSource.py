@@ -0,0 +1,120 @@
+import subprocess
+from typing import Optional
+
+import librosa
+import numpy as np
+from moviepy.config import get_setting
+
+from tools.Profiler import get_profiler
+
+# Аудиокодеки, которые можно скопировать в MP4 без перекодирования (по расширению исходника)
+MP4_COPY_EXTENSIONS = {'mp3', 'm4a', 'aac', 'mp4'}
+
+
+class AudioSource:
+    """
+    Источник аудио для одного рендера. Декодирует файл не более одного раза
+    и раздаёт сигнал для анализа и длительность. При сведении с видео исходная
+    звуковая дорожка копируется без повторного декодирования и кодирования.
+    """
+
+    def __init__(self, path: str, sr: int = 22050) -> None:
+        """
+        Инициализация источника.
+
+        :param path: Путь к аудиофайлу.
+        :param sr: Частота дискретизации сигнала для анализа (по умолчанию 22050).
+        """
+        self.path: str = path
+        self.sr: int = sr
+        self._y: Optional[np.ndarray] = None
+        self._duration: Optional[float] = None
+
+    @property
+    def is_decoded(self) -> bool:
+        """Был ли файл уже декодирован."""
+        return self._y is not None
+
+    @property
+    def signal(self) -> np.ndarray:
+        """
+        Моно-сигнал с частотой дискретизации sr. Файл декодируется при первом обращении.
+
+        :return: Массив отсчётов float32.
+        """
+        if self._y is None:
+            self._y, _ = librosa.load(self.path, sr=self.sr)
+            self._duration = len(self._y) / self.sr
+        return self._y
+
+    @property
+    def duration(self) -> float:
+        """
+        Длительность аудио в секундах. Если файл уже декодирован, берётся из сигнала,
+        иначе читается из метаданных файла без декодирования.
+
+        :return: Длительность в секундах.
+        """
+        if self._duration is None:
+            self._duration = librosa.get_duration(path=self.path)
+        return self._duration
+
+    def set_duration(self, duration: float) -> None:
+        """
+        Задаёт известную заранее длительность (например, из кэша анализа).
+
+        :param duration: Длительность в секундах.
+        """
+        self._duration = duration
+
+    def release(self) -> None:
+        """
+        Освобождает декодированный сигнал. Длительность сохраняется.
+        """
+        self._y = None
+
+    @property
+    def codec(self) -> str:
+        """
+        Кодек звука в MP4: 'copy', если кодек исходника допустим в MP4, иначе 'aac'.
+
+        :return: Значение параметра ffmpeg -c:a.
+        """
+        ext = self.path.split('.')[-1].lower()
+        return 'copy' if ext in MP4_COPY_EXTENSIONS else 'aac'
+
+    def ffmpeg_input(self, offset: float = 0.0) -> list[str]:
+        """
+        Аргументы ffmpeg, добавляющие аудиофайл как вход.
+
+        :param offset: Время в аудиофайле, с которого начинается звук.
+        :return: Аргументы командной строки.
+        """
+        return (['-ss', f'{offset:.6f}'] if offset else []) + ['-i', self.path]
+
+    def mux(self, video_path: str, output_path: str, duration: Optional[float] = None, offset: float = 0.0) -> None:
+        """
+        Сводит видеофайл без звука с исходной звуковой дорожкой.
+        Видео всегда копируется без перекодирования, звук копируется,
+        если его кодек допустим в MP4, иначе кодируется в AAC.
+
+        :param video_path: Путь к видеофайлу без звука.
+        :param output_path: Путь к итоговому файлу.
+        :param duration: Длительность итогового файла в секундах (по умолчанию — длительность видео).
+        :param offset: Время в аудиофайле, с которого начинается звук (для фрагментов клипа).
+        :raises ValueError: Если ffmpeg завершился с ошибкой.
+        """
+        cmd = [get_setting('FFMPEG_BINARY'), '-y', '-loglevel', 'error', '-i', video_path]
+        cmd += self.ffmpeg_input(offset)
+        cmd += ['-map', '0:v:0', '-map', '1:a:0',
+                '-c:v', 'copy', '-c:a', self.codec]
+        if duration is not None:
+            cmd += ['-t', f'{duration:.6f}']
+        else:
+            cmd += ['-shortest']
+        cmd.append(output_path)
+
+        with get_profiler().stage('mux', path=output_path):
+            result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            raise ValueError(f"Ошибка при сведении видео и звука: {result.stderr.decode(errors='replace')}")
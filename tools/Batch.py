@@ -0,0 +1,281 @@
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Optional
+
+from tools.AnalysisCache import AnalysisCache
+from tools.AudioSource import AudioSource
+from tools.FileTools import ensure_parent_dir
+from tools.FrameWriter import EncoderSettings
+from tools.LayoutBuilder import analyze_audio, create_layout
+from tools.MusicAnalyzer import MusicAnalyzer
+from tools.Profiler import get_profiler
+from tools.Renderer import render_video, source_id
+from tools.SpriteCache import SpriteCache
+
+# Кэши процесса пакетного рендера, создаются один раз при запуске процесса
+_worker_caches: Optional[tuple[SpriteCache, AnalysisCache]] = None
+
+
+class Job:
+    """
+    Задание пакетного рендера: один клип по фону, набору вставок и музыке.
+    """
+
+    def __init__(self, background: str, images: list[str], audio: str, output: str, sensitivity: float = 0.8,
+                 seed: Optional[int] = None, effects: Optional[list[int]] = None) -> None:
+        """
+        Инициализация задания.
+
+        :param background: Путь к фоновому изображению или видео.
+        :param images: Пути к вставляемым изображениям, GIF или видео.
+        :param audio: Путь к аудиофайлу.
+        :param output: Путь к итоговому файлу.
+        :param sensitivity: Процентиль силы битов, начиная с которого бит получает вставку (по умолчанию 0.8).
+        :param seed: Зерно генератора случайной раскладки.
+        :param effects: Флаги эффектов для каждой вставки (см. tools.Effects).
+        """
+        self.background: str = background
+        self.images: list[str] = list(images)
+        self.audio: str = audio
+        self.output: str = output
+        self.sensitivity: float = sensitivity
+        self.seed: Optional[int] = seed
+        self.effects: Optional[list[int]] = list(effects) if effects is not None else None
+
+    @classmethod
+    def from_dict(cls, data: dict, base_dir: str = '') -> 'Job':
+        """
+        Создаёт задание из записи манифеста. Относительные пути отсчитываются от base_dir.
+
+        :param data: Запись манифеста.
+        :param base_dir: Директория манифеста.
+        :return: Задание.
+        :raises ValueError: Если в записи нет обязательного поля или есть неизвестное.
+        """
+        missing = {'background', 'images', 'audio', 'output'} - data.keys()
+        if missing:
+            raise ValueError(f"В задании не хватает полей: {', '.join(sorted(missing))}")
+        unknown = data.keys() - {'background', 'images', 'audio', 'output', 'sensitivity', 'seed', 'effects'}
+        if unknown:
+            raise ValueError(f"Неизвестные поля задания: {', '.join(sorted(unknown))}")
+
+        def resolve(path: str) -> str:
+            return os.path.normpath(os.path.join(base_dir, path))
+
+        return cls(resolve(data['background']), [resolve(path) for path in data['images']], resolve(data['audio']),
+                   resolve(data['output']), data.get('sensitivity', 0.8), data.get('seed'), data.get('effects'))
+
+    def to_dict(self) -> dict:
+        """
+        Описание задания для файла состояния.
+
+        :return: Словарь из всех полей задания.
+        """
+        return {
+            'background': self.background,
+            'images': self.images,
+            'audio': self.audio,
+            'output': self.output,
+            'sensitivity': self.sensitivity,
+            'seed': self.seed,
+            'effects': self.effects,
+        }
+
+    def signature(self, fps: float, encoder: EncoderSettings) -> str:
+        """
+        Подпись задания: меняется при изменении любого параметра или любого входного файла,
+        поэтому готовый результат с той же подписью можно не пересчитывать.
+
+        :param fps: Частота кадров.
+        :param encoder: Параметры кодировщика.
+        :return: Шестнадцатеричная подпись.
+        """
+        sources = [source_id(path) for path in [self.background, self.audio, *self.images]]
+        description = json.dumps([self.to_dict(), sources, fps, encoder.key()], sort_keys=True)
+        return hashlib.blake2b(description.encode(), digest_size=16).hexdigest()
+
+
+def load_manifest(path: str) -> list[Job]:
+    """
+    Читает манифест пакетного рендера: JSON вида {"defaults": {...}, "jobs": [{...}, ...]}.
+    Поля заданий: background, images, audio, output, sensitivity, seed, effects; поля из defaults
+    подставляются во все задания. Относительные пути отсчитываются от директории манифеста.
+
+    :param path: Путь к манифесту.
+    :return: Задания в порядке манифеста.
+    :raises ValueError: Если манифест некорректен или у двух заданий один и тот же выходной файл.
+    """
+    with open(path) as f:
+        manifest = json.load(f)
+    if not isinstance(manifest, dict) or not isinstance(manifest.get('jobs'), list):
+        raise ValueError("Манифест должен содержать список заданий 'jobs'")
+
+    defaults = manifest.get('defaults', {})
+    base_dir = os.path.dirname(os.path.abspath(path))
+    jobs = [Job.from_dict({**defaults, **data}, base_dir) for data in manifest['jobs']]
+
+    outputs = [job.output for job in jobs]
+    duplicates = sorted({output for output in outputs if outputs.count(output) > 1})
+    if duplicates:
+        raise ValueError(f"Несколько заданий пишут в один файл: {', '.join(duplicates)}")
+    return jobs
+
+
+class BatchState:
+    """
+    Файл состояния пакетного рендера: подписи и время выполнения готовых заданий и ошибки.
+    Записывается атомарно после каждого задания, поэтому после сбоя готовые задания не повторяются.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Загружает состояние или создаёт пустое.
+
+        :param path: Путь к файлу состояния.
+        """
+        self.path: str = path
+        self.jobs: dict[str, dict] = {}
+        try:
+            with open(path) as f:
+                self.jobs = json.load(f).get('jobs', {})
+        except (OSError, ValueError):
+            pass
+
+    def is_done(self, job: Job, signature: str) -> bool:
+        """
+        Готово ли задание: результат с той же подписью записан и файл на месте.
+
+        :param job: Задание.
+        :param signature: Подпись задания.
+        :return: True, если задание можно пропустить.
+        """
+        entry = self.jobs.get(job.output)
+        return entry is not None and entry.get('signature') == signature and 'error' not in entry \
+            and os.path.exists(job.output)
+
+    def record(self, job: Job, entry: dict) -> None:
+        """
+        Записывает результат задания и сохраняет состояние.
+
+        :param job: Задание.
+        :param entry: Подпись, время этапов или ошибка.
+        """
+        self.jobs[job.output] = {'job': job.to_dict(), **entry}
+        ensure_parent_dir(self.path)
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'jobs': self.jobs}, f, indent=1, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+def run_batch(jobs: list[Job], state_path: str, workers: int = 1, fps: int = 24,
+              encoder: Optional[EncoderSettings] = None,
+              report: Optional[Callable[[Job, dict], None]] = None) -> dict[str, dict]:
+    """
+    Рендерит задания на постоянном пуле процессов. Каждый процесс один раз импортирует модули
+    и держит свои кэши вставок и анализа для всех своих заданий; вставки хранятся на диске
+    и разделяются между процессами через memory-map. Сначала анализируется каждый аудиофайл
+    (по одному разу на файл), затем рендерятся клипы, поэтому варианты чувствительности
+    одного трека берут анализ из кэша.
+
+    Результат пишется во временный файл и переименовывается в итоговый только после успешного
+    рендера. Задания, которые уже выполнены с теми же параметрами и входными файлами, пропускаются.
+
+    :param jobs: Задания.
+    :param state_path: Путь к файлу состояния.
+    :param workers: Количество процессов; при 1 задания выполняются в текущем процессе.
+    :param fps: Частота кадров.
+    :param encoder: Параметры кодировщика (по умолчанию EncoderSettings()).
+    :param report: Функция, которая вызывается после каждого задания с его записью в состоянии.
+    :return: Записи состояния по выходным файлам для заданий этого запуска.
+    """
+    encoder = encoder or EncoderSettings()
+    state = BatchState(state_path)
+    results = {}
+
+    def finish(job: Job, entry: dict) -> None:
+        state.record(job, entry)
+        results[job.output] = state.jobs[job.output]
+        if report:
+            report(job, results[job.output])
+
+    pending = []
+    for job in jobs:
+        try:
+            signature = job.signature(fps, encoder)
+        except OSError as e:
+            finish(job, {'error': f'{type(e).__name__}: {e}'})
+            continue
+        if state.is_done(job, signature):
+            results[job.output] = {**state.jobs[job.output], 'skipped': True}
+            if report:
+                report(job, results[job.output])
+        else:
+            pending.append((job, signature))
+    if not pending:
+        return results
+
+    audio_paths = list(dict.fromkeys(job.audio for job, _ in pending))
+    if workers <= 1 or len(pending) <= 1:
+        _init_batch_worker()
+        for path in audio_paths:
+            _analyze(path)
+        for job, signature in pending:
+            finish(job, {'signature': signature, **_run_job(job, fps, encoder)})
+        return results
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker) as pool:
+        list(pool.map(_analyze, audio_paths))
+        futures = {pool.submit(_run_job, job, fps, encoder): (job, signature) for job, signature in pending}
+        for future in as_completed(futures):
+            job, signature = futures[future]
+            finish(job, {'signature': signature, **future.result()})
+    return results
+
+
+def _init_batch_worker() -> None:
+    global _worker_caches
+    if _worker_caches is None:
+        # Все вставки на диске: каждая декодируется один раз и читается остальными процессами через memory-map
+        _worker_caches = SpriteCache(mmap_bytes=0), AnalysisCache()
+
+
+def _analyze(audio_path: str) -> None:
+    try:
+        MusicAnalyzer(audio_path=audio_path, log_file='logs/music_handler.log', cache=_worker_caches[1]).process()
+    except Exception:
+        # Ошибка попадёт в состояние заданий с этим файлом при их рендере
+        pass
+
+
+def _run_job(job: Job, fps: int, encoder: EncoderSettings) -> dict:
+    sprite_cache, analysis_cache = _worker_caches
+    stages = {}
+    start = time.perf_counter()
+    root, ext = os.path.splitext(job.output)
+    tmp_path = f'{root}.tmp{ext}'
+    try:
+        with get_profiler().stage('job', output=job.output):
+            audio = AudioSource(job.audio)
+            analyzer = analyze_audio(audio, analysis_cache)
+            stages['analysis'] = time.perf_counter() - start
+
+            mark = time.perf_counter()
+            layout = create_layout(job.background, job.images, analyzer, job.sensitivity, job.seed, job.effects,
+                                   sprite_cache)
+            stages['layout'] = time.perf_counter() - mark
+
+            mark = time.perf_counter()
+            render_video(layout.build_compositor(sprite_cache).to_clip(), tmp_path, fps=fps, audio=audio,
+                         encoder=encoder)
+            os.replace(tmp_path, job.output)
+            stages['render'] = time.perf_counter() - mark
+    except Exception as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return {'error': f'{type(e).__name__}: {e}', 'stages': stages, 'seconds': time.perf_counter() - start,
+                'pid': os.getpid()}
+    return {'stages': stages, 'seconds': time.perf_counter() - start, 'pid': os.getpid()}
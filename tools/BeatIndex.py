@@ -0,0 +1,139 @@
+import numpy as np
+
+
+class BeatIndex:
+    """
+    Биты трека на массивах NumPy: время и сила в порядке времени и заранее вычисленное
+    ранжирование по силе. Граница выборки по порогу, процентилю, топ-N или полосе процентилей
+    находится двоичным поиском или прямым обращением по рангу, за O(log n). Результат запроса —
+    тоже BeatIndex с копией выбранных k битов в порядке времени; он строится за O(k log k)
+    без пересортировки по силе и без проходов по всем битам трека.
+    """
+
+    def __init__(self, times: np.ndarray, strengths: np.ndarray) -> None:
+        """
+        Инициализация индекса. Ранжирование считается один раз за O(n log n).
+
+        :param times: Время битов в секундах в порядке возрастания.
+        :param strengths: Сила битов.
+        """
+        self.times: np.ndarray = np.asarray(times, dtype=np.float64)
+        self.strengths: np.ndarray = np.asarray(strengths, dtype=np.float64)
+        if self.times.shape != self.strengths.shape:
+            raise ValueError("Количество времён и сил битов не совпадает")
+        # Номера битов по возрастанию силы; при равной силе — в порядке времени
+        self._order: np.ndarray = np.argsort(self.strengths, kind='stable')
+        self._sorted: np.ndarray = self.strengths[self._order]
+
+    @classmethod
+    def _from_ranks(cls, parent: 'BeatIndex', ranks: np.ndarray) -> 'BeatIndex':
+        # Подмножество, заданное номерами битов родителя в порядке силы: ранжирование наследуется,
+        # а порядок времени восстанавливается сортировкой только выбранных номеров, за O(k log k)
+        index = cls.__new__(cls)
+        by_time = np.argsort(ranks)
+        positions = ranks[by_time]
+        index.times = parent.times[positions]
+        index.strengths = parent.strengths[positions]
+        index._order = np.empty(len(ranks), dtype=np.intp)
+        index._order[by_time] = np.arange(len(ranks))
+        index._sorted = parent.strengths[ranks]
+        return index
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def quantile(self, q: float) -> float:
+        """
+        Квантиль силы с линейной интерполяцией (как numpy.quantile и pandas.Series.quantile), за O(1).
+
+        :param q: Уровень квантиля от 0 до 1.
+        :return: Значение квантиля.
+        :raises ValueError: Если уровень вне [0, 1] или битов нет.
+        """
+        if not 0 <= q <= 1:
+            raise ValueError("Уровень квантиля должен быть в диапазоне [0, 1]")
+        if not len(self):
+            raise ValueError("Нет битов для вычисления квантиля")
+        pos = q * (len(self) - 1)
+        lo = int(np.floor(pos))
+        hi = min(lo + 1, len(self) - 1)
+        a, b = self._sorted[lo], self._sorted[hi]
+        t = pos - lo
+        # Та же формула, что у numpy, чтобы пороги совпадали до последнего бита
+        return float(b - (b - a) * (1 - t)) if t >= 0.5 else float(a + (b - a) * t)
+
+    def rank(self, threshold: float) -> int:
+        """
+        Количество битов со силой меньше порога.
+
+        :param threshold: Порог силы.
+        :return: Ранг порога.
+        """
+        return int(np.searchsorted(self._sorted, threshold, side='left'))
+
+    def count_above(self, threshold: float) -> int:
+        """
+        Количество битов с силой не меньше порога, за O(log n).
+
+        :param threshold: Порог силы.
+        :return: Количество битов.
+        """
+        return len(self) - self.rank(threshold)
+
+    def above(self, threshold: float) -> 'BeatIndex':
+        """
+        Биты с силой не меньше порога.
+
+        :param threshold: Порог силы.
+        :return: Индекс выбранных битов.
+        """
+        return self._from_ranks(self, self._order[self.rank(threshold):])
+
+    def above_percentile(self, percentile: float) -> 'BeatIndex':
+        """
+        Биты с силой не меньше заданного процентиля (как get_strong_beats_above_threshold).
+
+        :param percentile: Процентиль в диапазоне (0, 1].
+        :return: Индекс выбранных битов.
+        :raises ValueError: Если процентиль вне (0, 1].
+        """
+        if not 0 < percentile <= 1:
+            raise ValueError("percentile должен быть в диапазоне (0, 1].")
+        if not len(self):
+            return self
+        return self.above(self.quantile(percentile))
+
+    def band(self, low: float, high: float) -> 'BeatIndex':
+        """
+        Биты с силой в полосе процентилей [low, high); при high = 1 верхняя граница включается.
+
+        :param low: Нижний процентиль от 0 до 1.
+        :param high: Верхний процентиль от 0 до 1.
+        :return: Индекс выбранных битов.
+        """
+        if not len(self):
+            return self
+        start = self.rank(self.quantile(low))
+        end = len(self) if high >= 1 else self.rank(self.quantile(high))
+        return self._from_ranks(self, self._order[start:max(start, end)])
+
+    def top(self, n: int) -> 'BeatIndex':
+        """
+        n самых сильных битов.
+
+        :param n: Количество битов.
+        :return: Индекс выбранных битов в порядке времени.
+        """
+        n = max(0, min(n, len(self)))
+        return self._from_ranks(self, self._order[len(self) - n:])
+
+    def strongest(self, n: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        n самых сильных битов в порядке убывания силы.
+
+        :param n: Количество битов.
+        :return: Время и сила битов.
+        """
+        n = max(0, min(n, len(self)))
+        ranks = self._order[len(self) - n:][::-1]
+        return self.times[ranks], self.strengths[ranks]
@@ -0,0 +1,84 @@
+from typing import Callable, Optional
+
+import numpy as np
+
+# Ядро смешивания; выбирается при первом вызове blend, чтобы импорт numba не задерживал запуск
+_kernel: Optional[Callable[[np.ndarray, np.ndarray, np.ndarray], None]] = None
+
+
+def blend_numpy(dst: np.ndarray, src: np.ndarray, alpha: np.ndarray) -> None:
+    """
+    Смешивает src поверх dst на месте по альфа-каналу в целочисленной арифметике:
+    dst = round((src * a + dst * (255 - a)) / 255). Деление на 255 заменено сдвигами.
+    Результат совпадает с ядром numba бит в бит.
+
+    :param dst: Область кадра (h, w, 3) uint8, изменяется на месте.
+    :param src: Изображение (h, w, 3) uint8.
+    :param alpha: Альфа-канал (h, w) uint8.
+    """
+    a = alpha[..., None].astype(np.uint16)
+    # Не больше 255 * 255 + 128, поэтому uint16 не переполняется
+    v = src * a + dst * (255 - a) + 128
+    dst[:] = (v + (v >> 8)) >> 8
+
+
+def _blend_loops(dst: np.ndarray, src: np.ndarray, alpha: np.ndarray) -> None:
+    # Та же формула, что в blend_numpy, по пикселям: без временных массивов,
+    # прозрачные пиксели пропускаются, непрозрачные копируются
+    h, w = alpha.shape
+    for i in range(h):
+        for j in range(w):
+            a = np.uint32(alpha[i, j])
+            if a == 0:
+                continue
+            if a == 255:
+                for c in range(3):
+                    dst[i, j, c] = src[i, j, c]
+                continue
+            for c in range(3):
+                v = np.uint32(src[i, j, c]) * a + np.uint32(dst[i, j, c]) * (np.uint32(255) - a) + np.uint32(128)
+                dst[i, j, c] = (v + (v >> np.uint32(8))) >> np.uint32(8)
+
+
+def _load_kernel() -> Callable[[np.ndarray, np.ndarray, np.ndarray], None]:
+    try:
+        from numba import njit
+    except ImportError:
+        return blend_numpy
+    # Скомпилированный код сохраняется в кэш numba (NUMBA_CACHE_DIR) и при следующих запусках только загружается
+    return njit(cache=True, nogil=True)(_blend_loops)
+
+
+def blend(frame: np.ndarray, img: np.ndarray, x: int, y: int,
+          alpha: Optional[np.ndarray] = None) -> Optional[tuple[int, int, int, int]]:
+    """
+    Накладывает изображение на буфер кадра в позицию (x, y) на месте, обрезая части за пределами кадра.
+    Полупрозрачные пиксели смешиваются JIT-скомпилированным ядром (numba) в целочисленной арифметике,
+    без перевода в float и временных массивов; без numba используется blend_numpy.
+    Результат отличается от прежнего смешивания в float (blit_array с маской alpha / 255) не больше чем на 1
+    в каждом канале. От композиции moviepy вставки PNG отличаются до 2, потому что маска вставок квантуется
+    до uint8 при загрузке в SpriteCache.
+
+    :param frame: Буфер кадра (h, w, 3) uint8, изменяется на месте.
+    :param img: Накладываемое изображение (h, w, 3) uint8.
+    :param x: Координата X левого верхнего угла.
+    :param y: Координата Y левого верхнего угла.
+    :param alpha: Альфа-канал (h, w) uint8 или None для непрозрачного изображения.
+    :return: Изменённый прямоугольник кадра (y1, y2, x1, x2) или None, если изображение вне кадра.
+    """
+    global _kernel
+    fh, fw = frame.shape[:2]
+    ih, iw = img.shape[:2]
+    x1, y1 = max(0, -x), max(0, -y)
+    x2, y2 = min(iw, fw - x), min(ih, fh - y)
+    if x1 >= x2 or y1 >= y2:
+        return None
+
+    region = frame[y + y1:y + y2, x + x1:x + x2]
+    if alpha is None:
+        region[:] = img[y1:y2, x1:x2]
+    else:
+        if _kernel is None:
+            _kernel = _load_kernel()
+        _kernel(region, img[y1:y2, x1:x2], alpha[y1:y2, x1:x2])
+    return y + y1, y + y2, x + x1, x + x2
@@ -0,0 +1,201 @@
+import numpy as np
+from moviepy.video.VideoClip import VideoClip, ImageClip
+
+from tools.Blend import blend
+from tools.Effects import NEGATIVE, GLITCH, negative, glitch
+from tools.Schedule import sort_schedule
+from tools.SpriteCache import Sprite
+
+
+class Compositor:
+    """
+    Компоновщик кадров для большого числа вставок.
+    Вставки хранятся в интервальном индексе, отсортированном по времени начала,
+    поэтому для каждого кадра перебираются только активные в этот момент слои,
+    а не все вставки клипа. Слои смешиваются прямо в переиспользуемый буфер кадра.
+    Кадры вставок берутся из декодированных заранее Sprite, а не из клипов moviepy.
+    Если фон статичен, он собирается один раз, а в буфере кадра восстанавливаются только
+    прямоугольники, занятые слоями предыдущего кадра; если набор слоёв и их кадров
+    не изменился, предыдущий кадр возвращается без пересборки.
+    Вставки с прозрачностью смешиваются целочисленным ядром (см. tools.Blend) прямо по альфа-каналу uint8.
+    Эффекты слоёв: негатив вычисляется один раз на вставку, помехи генерируются пакетно
+    для всех слоёв кадра генератором, зависящим только от seed и времени кадра.
+    """
+
+    def __init__(
+            self,
+            background: VideoClip,
+            sprites: list[Sprite],
+            schedule: np.ndarray,
+            bg_color: tuple = (0, 0, 0),
+            seed: int = 0
+    ) -> None:
+        """
+        Инициализация компоновщика.
+
+        :param background: Фоновый клип. Определяет размер и длительность итогового видео.
+        :param sprites: Декодированные вставки.
+        :param schedule: Расписание вставок с типом PLACEMENT_DTYPE (см. tools.Schedule).
+        :param bg_color: Цвет подложки под фоном (по умолчанию чёрный, как у CompositeVideoClip).
+        :param seed: Зерно генератора помех.
+        """
+        self.background: VideoClip = background
+        self.sprites: list[Sprite] = sprites
+        self.size: tuple[int, int] = tuple(background.size)
+        self.duration: float = background.duration
+        self.bg_color: np.ndarray = np.array(bg_color, dtype=np.uint8)
+        self.seed: int = seed
+
+        # Порядок наложения совпадает с порядком в расписании, поэтому сортировка стабильная
+        schedule = sort_schedule(schedule)
+        self.sprite_ids: np.ndarray = np.ascontiguousarray(schedule['sprite'])
+        self.starts: np.ndarray = np.ascontiguousarray(schedule['start'])
+        self.ends: np.ndarray = np.ascontiguousarray(schedule['end'])
+        self.xs: np.ndarray = np.ascontiguousarray(schedule['x'])
+        self.ys: np.ndarray = np.ascontiguousarray(schedule['y'])
+        self.flags: np.ndarray = np.ascontiguousarray(schedule['flags'])
+        self._negatives: dict[int, Sprite] = {}
+        self.max_duration: float = float((self.ends - self.starts).max()) if len(schedule) else 0.0
+
+        w, h = self.size
+        self._frame: np.ndarray = np.empty((h, w, 3), dtype=np.uint8)
+
+        # Статичный фон собирается один раз
+        self._background_frame: np.ndarray | None = None
+        if isinstance(background, ImageClip):
+            self._background_frame = self._compose_background(0.0).copy()
+            self._frame[:] = self._background_frame
+        # Слои предыдущего кадра: (индекс слоя, номер кадра вставки) и занятые ими прямоугольники
+        self._prev_state: tuple | None = None
+        self._prev_rects: list[tuple[int, int, int, int]] = []
+        # Количество активных слоёв в последнем собранном кадре
+        self.layer_count: int = 0
+
+    def active_layers(self, t: float) -> np.ndarray:
+        """
+        Возвращает индексы слоёв, активных в момент времени t, в порядке наложения.
+        Кандидаты ограничены окном (t - max_duration, t], которое находится двоичным поиском.
+
+        :param t: Время в секундах.
+        :return: Массив индексов активных слоёв.
+        """
+        lo = np.searchsorted(self.starts, t - self.max_duration, side='left')
+        hi = np.searchsorted(self.starts, t, side='right')
+        candidates = np.arange(lo, hi)
+        return candidates[self.ends[lo:hi] > t]
+
+    def make_frame(self, t: float) -> np.ndarray:
+        """
+        Собирает кадр в момент времени t.
+        Возвращаемый массив — общий буфер компоновщика, он перезаписывается при следующем вызове.
+
+        :param t: Время в секундах.
+        :return: Кадр (h, w, 3) типа uint8.
+        """
+        active = self.active_layers(t)
+        self.layer_count = len(active)
+        indices = [self.sprites[self.sprite_ids[i]].frame_index(t - self.starts[i]) for i in active]
+        glitched = [bool(self.flags[i] & GLITCH) for i in active]
+
+        if self._background_frame is None:
+            frame = self._compose_background(t)
+        else:
+            # Помехи меняются в каждом кадре, поэтому такой кадр никогда не совпадает с предыдущим
+            state = (tuple(zip(active.tolist(), indices)), t if any(glitched) else None)
+            frame = self._frame
+            if state == self._prev_state:
+                return frame
+            self._prev_state = state
+            # Вне прямоугольников слоёв предыдущего кадра буфер уже совпадает с фоном
+            for y1, y2, x1, x2 in self._prev_rects:
+                frame[y1:y2, x1:x2] = self._background_frame[y1:y2, x1:x2]
+
+        images, masks = [], []
+        for i, k in zip(active, indices):
+            sprite = self._sprite(int(self.sprite_ids[i]), bool(self.flags[i] & NEGATIVE))
+            images.append(sprite.frames[k])
+            masks.append(sprite.alpha[k] if sprite.alpha is not None else None)
+
+        if any(glitched):
+            layers = [n for n, g in enumerate(glitched) if g]
+            rng = np.random.default_rng([self.seed, int(round(t * 1e6))])
+            noisy, noisy_masks = glitch([images[n] for n in layers], [masks[n] for n in layers], rng)
+            for n, img, mask in zip(layers, noisy, noisy_masks):
+                images[n], masks[n] = img, mask
+
+        rects = []
+        for i, img, mask in zip(active, images, masks):
+            rect = blend(frame, img, int(self.xs[i]), int(self.ys[i]), mask)
+            if rect is not None:
+                rects.append(rect)
+        self._prev_rects = rects
+        return frame
+
+    def _sprite(self, sprite_id: int, inverted: bool) -> Sprite:
+        if not inverted:
+            return self.sprites[sprite_id]
+        if sprite_id not in self._negatives:
+            self._negatives[sprite_id] = negative(self.sprites[sprite_id])
+        return self._negatives[sprite_id]
+
+    def _compose_background(self, t: float) -> np.ndarray:
+        frame = self._frame
+        frame[:] = self.bg_color
+        blit_clip(self.background, frame, t, 0.0)
+        return frame
+
+    def to_clip(self) -> VideoClip:
+        """
+        Оборачивает компоновщик в VideoClip для записи стандартными средствами moviepy.
+
+        :return: VideoClip с размером и длительностью фона.
+        """
+        clip = VideoClip(make_frame=self.make_frame, duration=self.duration)
+        clip.size = self.size
+        return clip
+
+
+def blit_clip(clip: VideoClip, frame: np.ndarray, t: float, start: float) -> None:
+    """
+    Накладывает кадр клипа на буфер на месте, с учётом маски и обрезкой по краям кадра.
+    Арифметика смешивания повторяет moviepy.video.tools.drawing.blit.
+
+    :param clip: Накладываемый клип.
+    :param frame: Буфер кадра, изменяется на месте.
+    :param t: Время итогового видео в секундах.
+    :param start: Время начала клипа.
+    """
+    ct = t - start
+    img = clip.get_frame(ct)
+    mask = clip.mask.get_frame(ct) if clip.mask is not None else None
+    x, y = (int(v) for v in clip.pos(ct))
+    blit_array(frame, img, x, y, mask)
+
+
+def blit_array(frame: np.ndarray, img: np.ndarray, x: int, y: int,
+               mask: np.ndarray | None = None) -> tuple[int, int, int, int] | None:
+    """
+    Накладывает изображение на буфер кадра в позицию (x, y), обрезая части за пределами кадра.
+
+    :param frame: Буфер кадра (h, w, 3) uint8, изменяется на месте.
+    :param img: Накладываемое изображение (h, w, 3).
+    :param x: Координата X левого верхнего угла.
+    :param y: Координата Y левого верхнего угла.
+    :param mask: Маска прозрачности (h, w) со значениями от 0 до 1 или None.
+    :return: Изменённый прямоугольник кадра (y1, y2, x1, x2) или None, если изображение вне кадра.
+    """
+    fh, fw = frame.shape[:2]
+    ih, iw = img.shape[:2]
+    x1, y1 = max(0, -x), max(0, -y)
+    x2, y2 = min(iw, fw - x), min(ih, fh - y)
+    if x1 >= x2 or y1 >= y2:
+        return None
+
+    region = frame[y + y1:y + y2, x + x1:x + x2]
+    blitted = img[y1:y2, x1:x2]
+    if mask is None:
+        region[:] = blitted
+    else:
+        m = mask[y1:y2, x1:x2, None]
+        region[:] = 1.0 * m * blitted + (1.0 - m) * region
+    return y + y1, y + y2, x + x1, x + x2
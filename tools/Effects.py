@@ -0,0 +1,67 @@
+from typing import Optional
+
+import numpy as np
+
+from tools.SpriteCache import Sprite
+
+# Флаги эффектов вставки (комбинируются через |)
+NEGATIVE = 1  # Вставка становится негативом
+GLITCH = 2  # Помехи: сдвиг строк и зернистость, новые в каждом кадре
+EDGE = 4  # Вставка может частично выходить за границу клипа
+
+# Таблица негатива: одно обращение по индексу на пиксель вместо арифметики
+NEGATIVE_LUT = (255 - np.arange(256)).astype(np.uint8)
+
+
+def negative(sprite: Sprite) -> Sprite:
+    """
+    Создаёт негатив вставки. Вычисляется один раз для всех кадров вставки.
+
+    :param sprite: Исходная вставка.
+    :return: Вставка с инвертированными цветами и той же прозрачностью.
+    """
+    return Sprite(NEGATIVE_LUT[sprite.frames], sprite.alpha, sprite.fps)
+
+
+def glitch(images: list[np.ndarray], masks: list[Optional[np.ndarray]], rng: np.random.Generator,
+           band_probability: float = 0.08, max_shift: int = 24,
+           grain: int = 24) -> tuple[list[np.ndarray], list[Optional[np.ndarray]]]:
+    """
+    Накладывает помехи сразу на все вставки кадра: случайные строки сдвигаются по горизонтали
+    (вместе с маской), на цвет добавляется зернистость. Случайные числа для всех вставок
+    генерируются одним вызовом на каждый вид шума.
+
+    :param images: Кадры вставок (h, w, 3) uint8.
+    :param masks: Маски вставок (h, w) или None.
+    :param rng: Генератор случайных чисел.
+    :param band_probability: Вероятность сдвига строки.
+    :param max_shift: Максимальный сдвиг строки в пикселях.
+    :param grain: Максимальная амплитуда зернистости.
+    :return: Новые кадры и маски в том же порядке.
+    """
+    heights = [img.shape[0] for img in images]
+    sizes = [img.size for img in images]
+    bands = rng.random(sum(heights)) < band_probability
+    shifts = np.where(bands, rng.integers(-max_shift, max_shift + 1, sum(heights)), 0)
+    noise = rng.integers(-grain, grain + 1, sum(sizes), dtype=np.int16)
+
+    out_images, out_masks = [], []
+    row_offset = pixel_offset = 0
+    for img, mask, h, size in zip(images, masks, heights, sizes):
+        out = img.astype(np.int16)
+        # Сдвигаются только строки, попавшие в полосы помех
+        rows = np.flatnonzero(shifts[row_offset:row_offset + h])
+        if rows.size:
+            cols = (np.arange(img.shape[1])[None, :] - shifts[row_offset + rows, None]) % img.shape[1]
+            out[rows] = out[rows[:, None], cols]
+            if mask is not None:
+                mask = mask.copy()
+                mask[rows] = mask[rows[:, None], cols]
+
+        out += noise[pixel_offset:pixel_offset + size].reshape(img.shape)
+        np.clip(out, 0, 255, out=out)
+        out_images.append(out.astype(np.uint8))
+        out_masks.append(mask)
+        row_offset += h
+        pixel_offset += size
+    return out_images, out_masks
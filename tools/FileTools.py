@@ -0,0 +1,12 @@
+import os
+
+
+def ensure_parent_dir(path: str) -> None:
+    """
+    Создаёт директорию файла, если её нет. Для пути без директории ничего не делает.
+
+    :param path: Путь к файлу.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
@@ -0,0 +1,196 @@
+import os
+import queue
+import subprocess
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+from moviepy.config import get_setting
+
+from tools.AudioSource import AudioSource
+from tools.Profiler import get_profiler
+
+
+class EncoderSettings:
+    """
+    Параметры кодировщика libx264. Передаются в процессы-рендереры и входят в ключи отрезков,
+    поэтому содержат только строки и числа.
+
+    В потоковом режиме результат пишется фрагментированным MP4 (или HLS, если путь оканчивается
+    на .m3u8): ключевой кадр и фрагмент начинаются каждые fragment_seconds секунд, а звук сводится
+    тем же процессом ffmpeg. Воспроизведение можно начать, как только записан первый фрагмент,
+    не дожидаясь конца рендера.
+    """
+
+    def __init__(self, preset: str = 'medium', threads: Optional[int] = None, pix_fmt: Optional[str] = None,
+                 ffmpeg_params: Optional[list[str]] = None, streaming: bool = False,
+                 fragment_seconds: float = 2.0) -> None:
+        """
+        Инициализация параметров.
+
+        :param preset: Пресет libx264 (по умолчанию 'medium', как у write_videofile).
+        :param threads: Количество потоков кодировщика (по умолчанию выбирает ffmpeg).
+        :param pix_fmt: Формат пикселей результата (по умолчанию yuv420p для чётных размеров кадра,
+            как у write_videofile).
+        :param ffmpeg_params: Дополнительные параметры кодировщика ffmpeg.
+        :param streaming: Писать ли результат фрагментами по мере кодирования (по умолчанию False).
+        :param fragment_seconds: Длительность фрагмента в секундах в потоковом режиме (по умолчанию 2).
+        """
+        self.preset: str = preset
+        self.threads: Optional[int] = threads
+        self.pix_fmt: Optional[str] = pix_fmt
+        self.ffmpeg_params: list[str] = list(ffmpeg_params or [])
+        self.streaming: bool = streaming
+        self.fragment_seconds: float = fragment_seconds
+
+    def key(self) -> tuple:
+        """
+        Описание параметров для ключей кэша.
+
+        :return: Кортеж из всех параметров.
+        """
+        return (self.preset, self.threads, self.pix_fmt, tuple(self.ffmpeg_params), self.streaming,
+                self.fragment_seconds)
+
+    def command(self, path: str, size: tuple[int, int], fps: float, audio: Optional[AudioSource] = None,
+                audio_offset: float = 0.0, duration: Optional[float] = None) -> list[str]:
+        """
+        Команда ffmpeg, которая читает кадры RGB24 из stdin и кодирует их в файл.
+
+        :param path: Путь к видеофайлу.
+        :param size: Размер кадра (ширина, высота).
+        :param fps: Частота кадров.
+        :param audio: Источник звука, который сводится с видео тем же процессом, или None для видео без звука.
+        :param audio_offset: Время в аудиофайле, с которого начинается звук.
+        :param duration: Длительность результата в секундах (по умолчанию — по более короткому потоку).
+        :return: Аргументы командной строки.
+        """
+        w, h = size
+        cmd = [get_setting('FFMPEG_BINARY'), '-y', '-loglevel', 'error',
+               '-f', 'rawvideo', '-vcodec', 'rawvideo', '-s', f'{w}x{h}', '-pix_fmt', 'rgb24',
+               '-r', f'{fps:.02f}', '-an', '-i', '-']
+        if audio is not None:
+            cmd += audio.ffmpeg_input(audio_offset)
+            cmd += ['-map', '0:v:0', '-map', '1:a:0', '-c:a', audio.codec]
+            cmd += ['-t', f'{duration:.6f}'] if duration is not None else ['-shortest']
+        cmd += ['-vcodec', 'libx264', '-preset', self.preset]
+        cmd += self.ffmpeg_params
+        if self.threads is not None:
+            cmd += ['-threads', str(self.threads)]
+        pix_fmt = self.pix_fmt or ('yuv420p' if w % 2 == 0 and h % 2 == 0 else None)
+        if pix_fmt is not None:
+            cmd += ['-pix_fmt', pix_fmt]
+        if self.streaming:
+            cmd += ['-g', str(max(1, round(fps * self.fragment_seconds)))]
+            if path.endswith('.m3u8'):
+                init_name = f'{os.path.splitext(os.path.basename(path))[0]}_init.mp4'
+                cmd += ['-f', 'hls', '-hls_time', f'{self.fragment_seconds:g}', '-hls_playlist_type', 'event',
+                        '-hls_segment_type', 'fmp4', '-hls_fmp4_init_filename', init_name]
+            else:
+                cmd += ['-movflags', 'frag_keyframe+empty_moov+default_base_moof']
+        cmd.append(path)
+        return cmd
+
+
+class FrameWriter:
+    """
+    Запись кадров в видеофайл с перекрытием сборки и кодирования.
+    Кадры копируются в один из заранее выделенных буферов и ставятся в ограниченную очередь,
+    а отдельный поток передаёт их в ffmpeg. Пока ffmpeg принимает кадр, следующий кадр уже
+    собирается, поэтому скорость записи близка к max(сборка, кодирование), а не к их сумме.
+    Память ограничена глубиной очереди.
+    """
+
+    def __init__(self, path: str, size: tuple[int, int], fps: float, encoder: Optional[EncoderSettings] = None,
+                 queue_depth: int = 4, audio: Optional[AudioSource] = None, audio_offset: float = 0.0,
+                 duration: Optional[float] = None) -> None:
+        """
+        Запускает ffmpeg и поток записи.
+
+        :param path: Путь к видеофайлу.
+        :param size: Размер кадра (ширина, высота).
+        :param fps: Частота кадров.
+        :param encoder: Параметры кодировщика (по умолчанию EncoderSettings()).
+        :param queue_depth: Количество буферов кадров в очереди (по умолчанию 4).
+        :param audio: Источник звука, который сводится с видео по мере кодирования, или None.
+        :param audio_offset: Время в аудиофайле, с которого начинается звук.
+        :param duration: Длительность результата в секундах (по умолчанию — по более короткому потоку).
+        """
+        encoder = encoder or EncoderSettings()
+        w, h = size
+        self._buffers: list[np.ndarray] = [np.empty((h, w, 3), dtype=np.uint8) for _ in range(max(1, queue_depth))]
+        self._free: queue.Queue = queue.Queue()
+        self._ready: queue.Queue = queue.Queue()
+        for i in range(len(self._buffers)):
+            self._free.put(i)
+        self._error: Optional[str] = None
+        self._profiler = get_profiler()
+
+        cmd = encoder.command(path, size, fps, audio, audio_offset, duration)
+        self._proc: subprocess.Popen = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                                        stderr=subprocess.PIPE)
+        self._thread: threading.Thread = threading.Thread(target=self._pipe_frames, daemon=True)
+        self._thread.start()
+
+    def write_frame(self, frame: np.ndarray) -> None:
+        """
+        Ставит кадр в очередь на кодирование. Кадр копируется, поэтому вызывающий
+        может сразу переиспользовать свой буфер. Блокируется, только если очередь заполнена.
+
+        :param frame: Кадр (h, w, 3).
+        :raises ValueError: Если ffmpeg завершился с ошибкой.
+        """
+        self._check()
+        start = time.perf_counter()
+        i = self._free.get()
+        # Время ожидания свободного буфера: если оно велико, узкое место — кодирование
+        self._profiler.add_event('encode_wait', start, time.perf_counter() - start)
+        np.copyto(self._buffers[i], frame, casting='unsafe')
+        self._ready.put(i)
+
+    def close(self) -> None:
+        """
+        Дожидается кодирования всех кадров из очереди и завершает ffmpeg.
+
+        :raises ValueError: Если ffmpeg завершился с ошибкой.
+        """
+        self._ready.put(None)
+        start = time.perf_counter()
+        self._thread.join()
+        try:
+            self._proc.stdin.close()
+        except OSError:
+            pass
+        stderr = self._proc.stderr.read()
+        self._proc.stderr.close()
+        if self._proc.wait() != 0:
+            self._error = stderr.decode(errors='replace') or self._error or 'ffmpeg завершился с ошибкой'
+        self._profiler.add_event('encode_flush', start, time.perf_counter() - start)
+        self._check()
+
+    def __enter__(self) -> 'FrameWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def _check(self) -> None:
+        if self._error is not None:
+            raise ValueError(f"Ошибка при кодировании видео: {self._error}")
+
+    def _pipe_frames(self) -> None:
+        while True:
+            i = self._ready.get()
+            if i is None:
+                return
+            if self._error is None:
+                try:
+                    # Запись в канал отпускает GIL, сборка следующего кадра идёт параллельно
+                    start = time.perf_counter()
+                    self._proc.stdin.write(memoryview(self._buffers[i]).cast('B'))
+                    self._profiler.add_event('encode', start, time.perf_counter() - start, thread='encoder')
+                except (BrokenPipeError, OSError) as e:
+                    self._error = str(e)
+            # После ошибки буферы продолжают возвращаться, чтобы write_frame не заблокировался
+            self._free.put(i)
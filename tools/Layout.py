@@ -0,0 +1,111 @@
+import json
+import os
+from typing import Optional
+
+import numpy as np
+from moviepy.video.fx.resize import resize
+
+from tools.Compositor import Compositor
+from tools.FileTools import ensure_parent_dir
+from tools.Schedule import PLACEMENT_DTYPE, sort_schedule
+from tools.SpriteCache import SpriteCache
+from tools.VideoTools import make_video
+
+# Версия формата файла раскладки
+LAYOUT_VERSION = 1
+
+
+class Layout:
+    """
+    Раскладка клипа: фон, набор вставляемых изображений и расписание вставок во времени и в кадре.
+    Содержит только пути, числа и компактный массив расписания, поэтому дёшево передаётся
+    в другие процессы, сохраняется в небольшой файл и позволяет собрать тот же самый клип.
+    """
+
+    def __init__(
+            self,
+            background_path: str,
+            sprite_paths: list[str],
+            duration: float,
+            schedule: np.ndarray,
+            sprite_scale: float = 0.3,
+            seed: int = 0
+    ) -> None:
+        """
+        Инициализация раскладки.
+
+        :param background_path: Путь к фоновому изображению или видео.
+        :param sprite_paths: Пути к вставляемым изображениям, GIF или видео.
+        :param duration: Длительность клипа в секундах.
+        :param schedule: Расписание вставок с типом PLACEMENT_DTYPE (см. tools.Schedule).
+        :param sprite_scale: Во сколько раз большая сторона самой крупной вставки меньше стороны фона.
+        :param seed: Зерно генератора помех.
+        """
+        self.background_path: str = background_path
+        self.sprite_paths: list[str] = sprite_paths
+        self.duration: float = duration
+        self.schedule: np.ndarray = sort_schedule(np.asarray(schedule, dtype=PLACEMENT_DTYPE))
+        self.sprite_scale: float = sprite_scale
+        self.seed: int = seed
+
+    def save(self, path: str) -> None:
+        """
+        Сохраняет раскладку в файл .npz: расписание как массив, остальное как JSON.
+
+        :param path: Путь к файлу.
+        """
+        meta = {
+            'version': LAYOUT_VERSION,
+            'background_path': self.background_path,
+            'sprite_paths': self.sprite_paths,
+            'duration': self.duration,
+            'sprite_scale': self.sprite_scale,
+            'seed': self.seed,
+        }
+        ensure_parent_dir(path)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(f, schedule=self.schedule, meta=np.array(json.dumps(meta, ensure_ascii=False)))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'Layout':
+        """
+        Загружает раскладку, сохранённую методом save.
+
+        :param path: Путь к файлу.
+        :return: Раскладка.
+        :raises ValueError: Если файл записан в другой версии формата.
+        """
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            schedule = data['schedule']
+        if meta.get('version') != LAYOUT_VERSION:
+            raise ValueError(f"Неподдерживаемая версия файла раскладки: {meta.get('version')}")
+        return cls(meta['background_path'], meta['sprite_paths'], meta['duration'], schedule,
+                   sprite_scale=meta['sprite_scale'], seed=meta['seed'])
+
+    def build_compositor(self, sprite_cache: Optional[SpriteCache] = None, scale: float = 1) -> Compositor:
+        """
+        Собирает компоновщик кадров по раскладке.
+
+        :param sprite_cache: Кэш вставок (по умолчанию создаётся новый).
+        :param scale: Масштаб кадра относительно фона, например 0.25 для черновика (по умолчанию 1).
+        :return: Компоновщик с фоном и всеми вставками.
+        """
+        sprite_cache = sprite_cache or SpriteCache()
+        main_clip = make_video(self.background_path, self.duration)
+        schedule = self.schedule
+
+        if scale != 1:
+            w, h = main_clip.size
+            # Чётные размеры нужны кодировщику libx264 с yuv420p
+            size = (max(2, int(w * scale) // 2 * 2), max(2, int(h * scale) // 2 * 2))
+            kx, ky = size[0] / w, size[1] / h
+            main_clip = main_clip.fx(resize, size)
+            schedule = schedule.copy()
+            schedule['x'] = (schedule['x'] * kx).astype(np.int32)
+            schedule['y'] = (schedule['y'] * ky).astype(np.int32)
+
+        sprites = sprite_cache.load_scaled(main_clip.size, self.sprite_paths, self.sprite_scale)
+        return Compositor(main_clip, sprites, schedule, seed=self.seed)
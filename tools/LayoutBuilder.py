@@ -0,0 +1,57 @@
+from typing import Optional
+
+from tools.AnalysisCache import AnalysisCache
+from tools.AudioSource import AudioSource
+from tools.Layout import Layout
+from tools.MusicAnalyzer import MusicAnalyzer
+from tools.Profiler import get_profiler
+from tools.Schedule import build_schedule, resolve_seed
+from tools.SpriteCache import SpriteCache
+from tools.VideoTools import make_video
+
+# Во сколько раз большая сторона самой крупной вставки меньше стороны фона
+SPRITE_SCALE = 0.3
+
+
+def analyze_audio(audio: AudioSource, analysis_cache: Optional[AnalysisCache] = None) -> MusicAnalyzer:
+    """
+    Анализирует музыку для раскладки. После анализа сигнал освобождается:
+    звук в итоговый файл копируется из исходника.
+
+    :param audio: Источник звука.
+    :param analysis_cache: Кэш анализа.
+    :return: Анализатор с найденными битами.
+    """
+    analyzer = MusicAnalyzer(audio_path=audio.path, log_file='logs/music_handler.log', cache=analysis_cache,
+                             source=audio)
+    analyzer.process()
+    audio.release()
+    return analyzer
+
+
+def create_layout(background_path: str, sprite_paths: list[str], analyzer: MusicAnalyzer, sensitivity: float,
+                  seed: Optional[int] = None, effects: Optional[list[int]] = None,
+                  sprite_cache: Optional[SpriteCache] = None) -> Layout:
+    """
+    Строит раскладку клипа по битам, сила которых не ниже заданного процентиля.
+
+    :param background_path: Путь к фоновому изображению или видео.
+    :param sprite_paths: Пути к вставляемым изображениям, GIF или видео.
+    :param analyzer: Анализатор после analyze_audio.
+    :param sensitivity: Процентиль силы битов, начиная с которого бит получает вставку.
+    :param seed: Зерно генератора случайной раскладки (по умолчанию случайное).
+    :param effects: Флаги эффектов для каждой вставки (см. tools.Effects).
+    :param sprite_cache: Кэш вставок.
+    :return: Раскладка.
+    """
+    # Зерно выбирается здесь, чтобы раскладка хранила то, по которому она построена
+    seed = resolve_seed(seed)
+    top_beats = analyzer.beats.above_percentile(sensitivity)
+    duration = analyzer.get_audio_duration()
+    main_clip = make_video(background_path, duration)
+    sprites = (sprite_cache or SpriteCache()).load_scaled(main_clip.size, sprite_paths, SPRITE_SCALE)
+
+    with get_profiler().stage('layout', beats=len(top_beats)):
+        schedule = build_schedule(top_beats, main_clip.size, [sprite.size for sprite in sprites], effects, seed)
+
+    return Layout(background_path, sprite_paths, duration, schedule, sprite_scale=SPRITE_SCALE, seed=seed)
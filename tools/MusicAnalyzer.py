@@ -1,18 +1,45 @@
 import librosa
 import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-import librosa.display
-from typing import Optional, List
+from typing import TYPE_CHECKING, Iterator, Optional
 import logging
 import os
 
+# pandas, matplotlib, soundfile и soxr импортируются в методах, которые их используют:
+# импорт модуля не должен задерживать запуск приложения и процессов-рендереров
+if TYPE_CHECKING:
+    import pandas as pd
+
+from tools.AnalysisCache import AnalysisCache
+from tools.AudioSource import AudioSource
+from tools.BeatIndex import BeatIndex
+from tools.Profiler import get_profiler
+from tools.TilePyramid import TileCache, TilePyramid
+
 
 class MusicException(Exception):
     """Исключение, связанное с ошибками в классе MusicAnalyzer."""
     pass
 
 
+def window_means(times: np.ndarray, values: np.ndarray, centers: np.ndarray, window: float) -> np.ndarray:
+    """
+    Средние значения values в окнах [c - window / 2, c + window / 2] вокруг каждого центра c.
+    Считается за один векторизованный проход через префиксные суммы и двоичный поиск.
+
+    :param times: Отсортированные моменты времени значений.
+    :param values: Значения, соответствующие times.
+    :param centers: Центры окон.
+    :param window: Ширина окна в секундах.
+    :return: Массив средних (0 для окон без значений).
+    """
+    prefix = np.concatenate(([0.0], np.cumsum(values, dtype=np.float64)))
+    lo = np.searchsorted(times, centers - window / 2, side='left')
+    hi = np.searchsorted(times, centers + window / 2, side='right')
+    counts = hi - lo
+    sums = prefix[hi] - prefix[lo]
+    return np.divide(sums, counts, out=np.zeros(len(centers)), where=counts > 0)
+
+
 class MusicAnalyzer:
     """
     Класс для анализа музыкальных аудиофайлов. Позволяет загружать аудио, обнаруживать биты,
@@ -25,8 +52,12 @@ class MusicAnalyzer:
             frame_length: int = 2048,
             hop_length: int = 512,
             strength_window: float = 0.05,
+            sr: int = 22050,
             verbose: bool = False,
-            log_file: Optional[str] = None
+            log_file: Optional[str] = None,
+            cache: Optional[AnalysisCache] = None,
+            source: Optional[AudioSource] = None,
+            tile_cache: Optional[TileCache] = None
     ) -> None:
         """
         Инициализация класса.
@@ -39,28 +70,46 @@ class MusicAnalyzer:
         :type hop_length: int
         :param strength_window: Окно времени (в секундах) вокруг бита для оценки его силы (по умолчанию 0.05).
         :type strength_window: float
+        :param sr: Частота дискретизации для анализа (по умолчанию 22050).
+        :type sr: int
         :param verbose: Флаг для вывода подробной информации (по умолчанию False).
         :type verbose: bool
         :param log_file: Путь к файлу для сохранения логов (по умолчанию None).
         :type log_file: Optional[str]
+        :param cache: Кэш результатов анализа (по умолчанию None — без кэширования).
+        :type cache: Optional[AnalysisCache]
+        :param source: Общий источник аудио. Если задан, сигнал берётся из него без повторного
+            декодирования, а частота дискретизации sr заменяется на частоту источника.
+        :type source: Optional[AudioSource]
+        :param tile_cache: Кэш пирамид волны и спектрограммы для интерфейса (по умолчанию None — не строить).
+            Пирамида строится в compute_features по уже вычисленным сигналу и спектрограмме.
+        :type tile_cache: Optional[TileCache]
         """
         self.audio_path: str = audio_path
         self.frame_length: int = frame_length
         self.hop_length: int = hop_length
         self.strength_window: float = strength_window
+        self.source: Optional[AudioSource] = source
+        self.target_sr: int = source.sr if source is not None else sr
+        self.cache: Optional[AnalysisCache] = cache
+        self.tile_cache: Optional[TileCache] = tile_cache
         self.__verbose: bool = verbose
 
         # Инициализация переменных
         self.y: Optional[np.ndarray] = None
         self.sr: Optional[int] = None
+        self.duration: Optional[float] = None
         self.tempo: Optional[float] = None
         self.beat_frames: Optional[np.ndarray] = None
         self.beat_times: Optional[np.ndarray] = None
         self.rms: Optional[np.ndarray] = None
+        self.onset_env: Optional[np.ndarray] = None
         self.times: Optional[np.ndarray] = None
-        self.beat_strengths: Optional[List[float]] = None
-        self.df_beats: Optional[pd.DataFrame] = None
-        self.top_beats: Optional[pd.DataFrame] = None
+        self.beat_strengths: Optional[np.ndarray] = None
+        self.beats: Optional[BeatIndex] = None
+        self.df_beats: Optional['pd.DataFrame'] = None
+        self.top_beats: Optional['pd.DataFrame'] = None
+        self.tiles: Optional[TilePyramid] = None
 
         # Настройка логирования
         self.logger = logging.getLogger(self.__class__.__name__)
@@ -104,63 +153,84 @@ class MusicAnalyzer:
 
     def load_audio(self) -> None:
         """
-        Загрузка аудиофайла с помощью librosa.
+        Загрузка аудиофайла с помощью librosa или из общего источника аудио.
 
         :raises MusicException: Если не удалось загрузить аудиофайл.
         """
         try:
-            self.y, self.sr = librosa.load(self.audio_path)
+            if self.source is not None:
+                self.y, self.sr = self.source.signal, self.source.sr
+            else:
+                self.y, self.sr = librosa.load(self.audio_path, sr=self.target_sr)
+            self.duration = len(self.y) / self.sr
             self.logger.info(f"Аудиофайл '{self.audio_path}' загружен. Частота дискретизации: {self.sr} Гц.")
         except Exception as e:
             self.logger.error(f"Ошибка загрузки аудиофайла: {e}")
             raise MusicException(f"Ошибка загрузки аудиофайла: {e}")
 
-    def compute_rms(self) -> None:
+    def compute_features(self, block_frames: int = 2048) -> None:
         """
-        Вычисление энергии (RMS) для каждого фрейма.
+        Единый проход по STFT: вычисление энергии (RMS) для каждого фрейма и огибающей
+        начала нот (onset envelope) для обнаружения битов. Спектрограмма считается один раз
+        блоками по block_frames фреймов, поэтому полная STFT длинного трека не держится в памяти.
 
+        :param block_frames: Количество фреймов STFT в одном блоке (по умолчанию 2048).
+        :type block_frames: int
         :raises MusicException: Если аудиофайл не загружен.
         """
         if self.y is None or self.sr is None:
-            raise MusicException("Аудиофайл не загружен. Вызовите метод load_audio() перед compute_rms().")
+            raise MusicException("Аудиофайл не загружен. Вызовите метод load_audio() перед compute_features().")
+
+        n_fft, hop = self.frame_length, self.hop_length
+        # Те же фреймы, что у librosa.stft(center=True): сигнал дополняется нулями на n_fft // 2 с каждой стороны
+        y_pad = np.pad(self.y, n_fft // 2)
+        n_frames = 1 + (len(y_pad) - n_fft) // hop
+
+        mel_basis = librosa.filters.mel(sr=self.sr, n_fft=n_fft)
+        rms = np.empty(n_frames, dtype=np.float32)
+        mel_db = np.empty((mel_basis.shape[0], n_frames), dtype=np.float32)
+
+        for start in range(0, n_frames, block_frames):
+            end = min(start + block_frames, n_frames)
+            block = y_pad[start * hop:(end - 1) * hop + n_fft]
+            power = np.abs(librosa.stft(block, n_fft=n_fft, hop_length=hop, center=False)) ** 2
 
-        self.rms = librosa.feature.rms(y=self.y, frame_length=self.frame_length, hop_length=self.hop_length)[0]
-        self.times = librosa.frames_to_time(np.arange(len(self.rms)), sr=self.sr, hop_length=self.hop_length)
-        self.logger.info("RMS энергия вычислена.")
+            rms[start:end] = librosa.feature.rms(S=np.sqrt(power), frame_length=n_fft, hop_length=hop)[0]
+            mel_db[:, start:end] = librosa.power_to_db(mel_basis @ power, top_db=None)
+
+        # Ограничение динамического диапазона, как в librosa.power_to_db(top_db=80), по максимуму всего трека
+        np.maximum(mel_db, mel_db.max() - 80.0, out=mel_db)
+
+        self.rms = rms
+        self.times = librosa.frames_to_time(np.arange(n_frames), sr=self.sr, hop_length=hop)
+        # Медиана по полосам, как в librosa.beat.beat_track(y=...), чтобы биты не отличались от прежних
+        self.onset_env = librosa.onset.onset_strength(S=mel_db, sr=self.sr, n_fft=n_fft, hop_length=hop,
+                                                      aggregate=np.median)
+        self.logger.info("RMS энергия и огибающая начала нот вычислены.")
+
+        if self.tile_cache is not None:
+            with get_profiler().stage('tiles'):
+                self.tiles = self.tile_cache.save(self._cache_key(self.tile_cache), self.y, self.sr, mel_db, hop)
+            self.logger.info("Пирамида волны и спектрограммы построена.")
 
     def detect_beats(self) -> None:
         """
-        Обнаружение битов с помощью librosa.
+        Обнаружение битов с помощью librosa по огибающей начала нот.
 
         :raises MusicException: Если не удалось обнаружить биты.
         """
-        if self.y is None or self.sr is None:
-            raise MusicException("Аудиофайл не загружен. Вызовите метод load_audio() перед detect_beats().")
+        if self.onset_env is None or self.sr is None:
+            raise MusicException("Признаки не вычислены. Вызовите метод compute_features() перед detect_beats().")
 
         try:
-            self.tempo, self.beat_frames = librosa.beat.beat_track(y=self.y, sr=self.sr)
+            self.tempo, self.beat_frames = librosa.beat.beat_track(onset_envelope=self.onset_env, sr=self.sr,
+                                                                   hop_length=self.hop_length)
             self.beat_times = librosa.frames_to_time(self.beat_frames, sr=self.sr, hop_length=self.hop_length)
             self.logger.info(f"Биты обнаружены. Темп: {self.tempo} BPM. Количество битов: {len(self.beat_times)}.")
         except Exception as e:
             self.logger.error(f"Ошибка обнаружения битов: {e}")
             raise MusicException(f"Ошибка обнаружения битов: {e}")
 
-    def _get_beat_strength(self, beat_time: float) -> float:
-        """
-        Получение RMS энергии в окне вокруг бита.
-
-        :param beat_time: Время бита в секундах.
-        :type beat_time: float
-        :return: Среднее значение RMS энергии в окне вокруг бита.
-        :rtype: float
-        """
-        start_time = beat_time - self.strength_window / 2
-        end_time = beat_time + self.strength_window / 2
-        indices = np.where((self.times >= start_time) & (self.times <= end_time))[0]
-        if len(indices) == 0:
-            return 0.0
-        return float(np.mean(self.rms[indices]))
-
     def calculate_beat_strengths(self) -> None:
         """
         Оценка силы каждого бита на основе RMS энергии в окне вокруг бита.
@@ -168,14 +238,16 @@ class MusicAnalyzer:
         :raises MusicException: Если биты не обнаружены или RMS не вычислена.
         """
         if self.beat_times is None or self.rms is None or self.times is None:
-            raise MusicException("Необходимые данные отсутствуют. Выполните методы detect_beats() и compute_rms().")
+            raise MusicException("Необходимые данные отсутствуют. "
+                                 "Выполните методы detect_beats() и compute_features().")
 
-        self.beat_strengths = [self._get_beat_strength(bt) for bt in self.beat_times]
+        self.beat_strengths = window_means(self.times, self.rms, self.beat_times, self.strength_window)
         self.logger.info("Сила битов рассчитана.")
 
-    def create_beats_dataframe(self) -> None:
+    def build_beat_index(self) -> None:
         """
-        Создание DataFrame с таймкодами битов и их силой.
+        Построение индекса битов с ранжированием по силе (см. BeatIndex).
+        Запросы по порогу, процентилю и топ-N после этого выполняются без сортировки и pandas.
 
         :raises MusicException: Если силы битов не рассчитаны.
         """
@@ -183,49 +255,70 @@ class MusicAnalyzer:
             raise MusicException(
                 "Необходимые данные отсутствуют. Выполните методы detect_beats() и calculate_beat_strengths().")
 
-        self.df_beats = pd.DataFrame({
-            'Beat Time (s)': self.beat_times,
-            'Strength': self.beat_strengths
-        })
+        self.beats = BeatIndex(self.beat_times, self.beat_strengths)
+        self.logger.info("Индекс битов построен.")
+
+    def create_beats_dataframe(self) -> None:
+        """
+        Создание DataFrame с таймкодами битов и их силой. Нужен для выгрузки и совместимости,
+        запросы по силе битов выполняет индекс beats.
+
+        :raises MusicException: Если силы битов не рассчитаны.
+        """
+        self.build_beat_index()
+        self.df_beats = self._beats_dataframe(self.beats.times, self.beats.strengths)
         self.logger.info("DataFrame с битами создан.")
 
-    def get_top_beats(self, top_n: int = 10) -> pd.DataFrame:
+    def get_top_beats(self, top_n: int = 10) -> 'pd.DataFrame':
         """
-        Получение топ-N самых сильных битов.
+        Получение топ-N самых сильных битов в порядке убывания силы.
 
         :param top_n: Количество топ-битов для выбора (по умолчанию 10).
         :type top_n: int
         :return: DataFrame с топ-битами.
         :rtype: pd.DataFrame
-        :raises MusicException: Если DataFrame битов не создан.
+        :raises MusicException: Если индекс битов не построен.
         """
-        if self.df_beats is None:
-            raise MusicException("DataFrame битов не создан. Выполните метод create_beats_dataframe().")
+        beats = self._require_beats()
 
-        self.top_beats = self.df_beats.sort_values(by='Strength', ascending=False).head(top_n)
+        self.top_beats = self._beats_dataframe(*beats.strongest(top_n))
         self.logger.info(f"Топ-{top_n} самых сильных битов выбраны.")
         return self.top_beats
 
-    def get_strong_beats_above_threshold(self, percentile: float = 0.75) -> pd.DataFrame:
+    def get_strong_beats_above_threshold(self, percentile: float = 0.75) -> 'pd.DataFrame':
         """
         Получение битов с силой выше заданного процентиля.
+        Для частых запросов (ползунок чувствительности) используйте beats.above_percentile(),
+        который возвращает BeatIndex без создания DataFrame.
 
         :param percentile: Процентиль для определения порога (должен быть в диапазоне (0, 1], по умолчанию 0.75).
         :type percentile: float
         :return: DataFrame с сильными битами.
         :rtype: pd.DataFrame
-        :raises MusicException: Если DataFrame битов не создан или процентиль вне допустимого диапазона.
+        :raises MusicException: Если индекс битов не построен или процентиль вне допустимого диапазона.
         """
-        if self.df_beats is None:
-            raise MusicException("DataFrame битов не создан. Выполните метод create_beats_dataframe().")
+        beats = self._require_beats()
 
         if not 0 < percentile <= 1:
             raise MusicException("percentile должен быть в диапазоне (0, 1].")
 
-        threshold = self.df_beats['Strength'].quantile(percentile)
-        strong_beats = self.df_beats[self.df_beats['Strength'] >= threshold]
-        self.logger.info(f"Биты с силой выше {percentile * 100}-го процентиля ({threshold:.4f}) выбраны.")
-        return strong_beats
+        strong_beats = beats.above_percentile(percentile)
+        self.logger.info(f"Биты с силой выше {percentile * 100}-го процентиля выбраны: {len(strong_beats)}.")
+        return self._beats_dataframe(strong_beats.times, strong_beats.strengths)
+
+    def _require_beats(self) -> BeatIndex:
+        if self.beats is None:
+            raise MusicException("Индекс битов не построен. Выполните метод build_beat_index().")
+        return self.beats
+
+    @staticmethod
+    def _beats_dataframe(times: np.ndarray, strengths: np.ndarray) -> 'pd.DataFrame':
+        import pandas as pd
+
+        return pd.DataFrame({
+            'Beat Time (s)': times,
+            'Strength': strengths
+        })
 
     def visualize_beats(self, top_n: int = 10) -> None:
         """
@@ -233,10 +326,16 @@ class MusicAnalyzer:
 
         :param top_n: Количество топ-битов для выделения (по умолчанию 10).
         :type top_n: int
-        :raises MusicException: Если DataFrame битов не создан.
+        :raises MusicException: Если индекс битов не построен.
         """
-        if self.df_beats is None:
-            raise MusicException("DataFrame битов не создан. Выполните метод create_beats_dataframe().")
+        beats = self._require_beats()
+
+        import librosa.display
+        import matplotlib.pyplot as plt
+
+        # При загрузке результатов из кэша сам сигнал не декодируется
+        if self.y is None:
+            self.load_audio()
 
         plt.figure(figsize=(14, 6))
 
@@ -244,7 +343,7 @@ class MusicAnalyzer:
         librosa.display.waveshow(self.y, sr=self.sr, alpha=0.6, label='Waveform')
 
         # Нанесение всех битов
-        plt.vlines(self.get_top_beats(len(self.df_beats) // 10)['Beat Time (s)'], ymin=-1, ymax=1, color='gray',
+        plt.vlines(self.get_top_beats(len(beats) // 10)['Beat Time (s)'], ymin=-1, ymax=1, color='gray',
                    linestyle='--', alpha=0.5,
                    label='Top 10% Beats')
 
@@ -265,10 +364,11 @@ class MusicAnalyzer:
 
         :param filepath: Путь для сохранения CSV файла (по умолчанию 'beat_times.csv').
         :type filepath: str
-        :raises MusicException: Если DataFrame битов не создан.
+        :raises MusicException: Если индекс битов не построен.
         """
+        self._require_beats()
         if self.df_beats is None:
-            raise MusicException("DataFrame битов не создан. Выполните метод create_beats_dataframe().")
+            self.create_beats_dataframe()
 
         try:
             # Создаем директорию для файла, если она не существует
@@ -282,31 +382,249 @@ class MusicAnalyzer:
     def get_audio_duration(self) -> float:
         """
         Возвращает длительность музыкального файла.
+        Если аудио уже декодировано или результаты взяты из кэша, файл повторно не читается.
 
         :return: Длительность файла в секундах.
         :rtype: float
         """
+        if self.duration is not None:
+            return self.duration
+
         try:
             # Загружаем только информацию о длительности файла
-            duration = librosa.get_duration(filename=self.audio_path)
-            return duration
+            self.duration = librosa.get_duration(path=self.audio_path)
+            return self.duration
         except Exception as e:
             raise MusicException(f"Ошибка при получении длительности файла: {e}")
 
+    def _cache_key(self, cache: Optional[AnalysisCache] = None) -> str:
+        """
+        Ключ записи кэша для текущего аудиофайла и параметров анализа.
+
+        :param cache: Кэш, для которого строится ключ (по умолчанию кэш анализа).
+        :type cache: Optional[AnalysisCache]
+        :return: Ключ записи.
+        :rtype: str
+        """
+        return (cache or self.cache).make_key(
+            self.audio_path,
+            frame_length=self.frame_length,
+            hop_length=self.hop_length,
+            strength_window=self.strength_window,
+            sr=self.target_sr
+        )
+
+    def load_from_cache(self) -> bool:
+        """
+        Загрузка результатов анализа из кэша.
+
+        :return: True, если результаты найдены в кэше.
+        :rtype: bool
+        """
+        if self.cache is None:
+            return False
+
+        data = self.cache.load(self._cache_key())
+        if data is None:
+            return False
+
+        self.sr = self.target_sr
+        self.beat_times = data['beat_times']
+        self.beat_frames = librosa.time_to_frames(self.beat_times, sr=self.sr, hop_length=self.hop_length)
+        self.beat_strengths = data['beat_strengths']
+        self.rms = data['rms']
+        self.times = data['times']
+        self.tempo = float(data['tempo'])
+        self.duration = float(data['duration'])
+        if self.source is not None:
+            self.source.set_duration(self.duration)
+        self.logger.info(f"Результаты анализа '{self.audio_path}' загружены из кэша.")
+        return True
+
+    def save_to_cache(self) -> None:
+        """
+        Сохранение результатов анализа в кэш.
+
+        :raises MusicException: Если анализ не выполнен.
+        """
+        if self.cache is None:
+            return
+
+        if self.beat_times is None or self.beat_strengths is None:
+            raise MusicException("Необходимые данные отсутствуют. Выполните метод process().")
+
+        self.cache.save(self._cache_key(), {
+            'beat_times': np.asarray(self.beat_times, dtype=np.float64),
+            'beat_strengths': np.asarray(self.beat_strengths, dtype=np.float32),
+            'rms': np.asarray(self.rms, dtype=np.float32),
+            'times': np.asarray(self.times, dtype=np.float64),
+            'tempo': np.float64(np.ravel(self.tempo)[0]),
+            'duration': np.float64(self.duration)
+        })
+        self.logger.info("Результаты анализа сохранены в кэш.")
+
     def process(self) -> None:
         """
         Полный процесс анализа: загрузка аудио, вычисление RMS, обнаружение битов,
-        оценка их силы и создание DataFrame.
+        оценка их силы и построение индекса битов. Если задан кэш и в нём есть результаты
+        для этого файла и параметров (и пирамида, если задан tile_cache), аудио не декодируется.
 
         :raises MusicException: Если любой из этапов анализа завершается с ошибкой.
         """
+        profiler = get_profiler()
         try:
-            self.load_audio()
-            self.compute_rms()
-            self.detect_beats()
-            self.calculate_beat_strengths()
-            self.create_beats_dataframe()
+            with profiler.stage('analysis_cache'):
+                cached = self.load_from_cache()
+            if cached and self.tile_cache is not None:
+                self.tiles = self.tile_cache.load(self._cache_key(self.tile_cache))
+                # Без пирамиды анализ выполняется заново: она строится по декодированному сигналу
+                cached = self.tiles is not None
+            if cached:
+                self.build_beat_index()
+                return
+
+            with profiler.stage('decode', path=self.audio_path):
+                self.load_audio()
+            with profiler.stage('features'):
+                self.compute_features()
+            with profiler.stage('beats'):
+                self.detect_beats()
+                self.calculate_beat_strengths()
+            self.build_beat_index()
+            self.save_to_cache()
             self.logger.info("Анализ завершен.")
         except MusicException as e:
             self.logger.error(f"Процесс анализа прерван: {e}")
             raise
+
+    def stream(self, block_frames: int = 1024, context_frames: int = 2048) -> Iterator[tuple[float, float]]:
+        """
+        Потоковый анализ с ограниченной памятью для очень длинных файлов.
+        Аудио читается блоками, признаки (RMS и огибающая начала нот) считаются по тем же
+        фреймам, что и в compute_features(), а биты ищутся в скользящем окне из
+        context_frames + block_frames фреймов. Биты выдаются по мере обработки, память
+        не зависит от длительности трека.
+
+        Точность относительно process(): силы совпадающих битов отличаются не более чем
+        на 1% (RMS считается по тем же фреймам; расхождения дают только потоковая передискретизация
+        и ограничение динамического диапазона по текущему, а не общему максимуму). Моменты битов
+        совпадают с точностью до 2 фреймов (2 * hop_length / sr секунд); поскольку темп оценивается
+        по окну, а не по всему треку, у границ окон отдельные биты могут быть пропущены или добавлены.
+
+        :param block_frames: Количество новых фреймов между запусками поиска битов (по умолчанию 1024).
+        :type block_frames: int
+        :param context_frames: Количество предыдущих фреймов, используемых как контекст (по умолчанию 2048).
+        :type context_frames: int
+        :return: Генератор пар (время бита в секундах, сила бита).
+        :rtype: Iterator[tuple[float, float]]
+        :raises MusicException: Если не удалось прочитать аудиофайл.
+        """
+        import soundfile as sf
+        import soxr
+
+        n_fft, hop = self.frame_length, self.hop_length
+        sr = self.target_sr
+        # Сдвиг огибающей начала нот относительно фреймов, как в librosa.onset.onset_strength(center=True)
+        onset_shift = n_fft // (2 * hop)
+        # Биты ближе guard фреймов к концу окна ещё могут сместиться и выдаются на следующем шаге
+        guard = max(context_frames // 4, int(np.ceil(self.strength_window * sr / hop)) + 1)
+
+        try:
+            info = sf.info(self.audio_path)
+        except Exception as e:
+            self.logger.error(f"Ошибка загрузки аудиофайла: {e}")
+            raise MusicException(f"Ошибка загрузки аудиофайла: {e}")
+
+        resampler = soxr.ResampleStream(info.samplerate, sr, 1, dtype='float32', quality='HQ') \
+            if info.samplerate != sr else None
+        mel_basis = librosa.filters.mel(sr=sr, n_fft=n_fft)
+
+        pending = np.zeros(n_fft // 2, dtype=np.float32)  # Отсчёты, ещё не разобранные на фреймы
+        n_frames = 0  # Количество обработанных фреймов
+        hist_start = 0  # Глобальный индекс первого фрейма в буферах
+        rms_hist = np.empty(0, dtype=np.float32)
+        env_hist = np.zeros(onset_shift, dtype=np.float32)
+        prev_db: Optional[np.ndarray] = None
+        db_max = -np.inf
+        tracked_upto = 0  # Количество фреймов огибающей на момент последнего поиска битов
+        emit_from = 0  # Глобальный индекс фрейма, начиная с которого биты ещё не выданы
+        last_beat = -np.inf
+
+        def consume(samples: np.ndarray) -> None:
+            nonlocal pending, n_frames, rms_hist, env_hist, prev_db, db_max
+            pending = np.concatenate((pending, samples))
+            if len(pending) < n_fft:
+                return
+            count = 1 + (len(pending) - n_fft) // hop
+            power = np.abs(librosa.stft(pending[:(count - 1) * hop + n_fft], n_fft=n_fft, hop_length=hop,
+                                        center=False)) ** 2
+            pending = pending[count * hop:]
+
+            rms = librosa.feature.rms(S=np.sqrt(power), frame_length=n_fft, hop_length=hop)[0]
+            mel_db = librosa.power_to_db(mel_basis @ power, top_db=None)
+            db_max = max(db_max, float(mel_db.max()))
+            np.maximum(mel_db, db_max - 80.0, out=mel_db)
+
+            with_prev = mel_db if prev_db is None else np.concatenate((prev_db, mel_db), axis=1)
+            env = np.median(np.maximum(0.0, np.diff(with_prev, axis=1)), axis=0).astype(np.float32)
+            if prev_db is None:
+                env = np.concatenate(([0.0], env)).astype(np.float32)
+            prev_db = mel_db[:, -1:]
+
+            rms_hist = np.concatenate((rms_hist, rms))
+            env_hist = np.concatenate((env_hist, env))
+            n_frames += count
+
+        def track(final: bool) -> Iterator[tuple[float, float]]:
+            nonlocal hist_start, rms_hist, env_hist, tracked_upto, emit_from, last_beat
+            available = n_frames
+            win_start = max(hist_start, available - context_frames - block_frames)
+            window = env_hist[win_start - hist_start:available - hist_start]
+            tracked_upto = available
+            if len(window) == 0:
+                return
+
+            tempo, beats = librosa.beat.beat_track(onset_envelope=window, sr=sr, hop_length=hop)
+            beats = beats + win_start
+            emit_to = available if final else available - guard
+            beats = beats[(beats >= emit_from) & (beats < emit_to)]
+
+            beat_times = librosa.frames_to_time(beats, sr=sr, hop_length=hop)
+            times = librosa.frames_to_time(np.arange(hist_start, hist_start + len(rms_hist)), sr=sr,
+                                           hop_length=hop)
+            strengths = window_means(times, rms_hist, beat_times, self.strength_window)
+            # Бит у границы окна может попасть в соседнее окно со сдвигом: отбрасываем повторы
+            min_gap = 30.0 / float(np.ravel(tempo)[0]) if np.ravel(tempo)[0] > 0 else 0.0
+            for bt, strength in zip(beat_times, strengths):
+                if bt - last_beat >= min_gap:
+                    last_beat = bt
+                    yield float(bt), float(strength)
+
+            emit_from = max(emit_from, emit_to)
+            # Отбрасываем фреймы, которые больше не понадобятся ни как контекст, ни для силы битов
+            keep_from = max(hist_start, min(emit_from - guard, available - context_frames))
+            rms_hist = rms_hist[keep_from - hist_start:]
+            env_hist = env_hist[keep_from - hist_start:]
+            hist_start = keep_from
+
+        try:
+            for block in sf.blocks(self.audio_path, blocksize=block_frames * hop, dtype='float32',
+                                   always_2d=True):
+                samples = block.mean(axis=1)
+                if resampler is not None:
+                    samples = resampler.resample_chunk(samples)
+                consume(samples)
+                if n_frames - tracked_upto >= block_frames:
+                    yield from track(final=False)
+
+            tail = np.zeros(n_fft // 2, dtype=np.float32)
+            if resampler is not None:
+                tail = np.concatenate((resampler.resample_chunk(np.empty(0, dtype=np.float32), last=True), tail))
+            consume(tail)
+            yield from track(final=True)
+        except MusicException:
+            raise
+        except Exception as e:
+            self.logger.error(f"Ошибка потокового анализа: {e}")
+            raise MusicException(f"Ошибка потокового анализа: {e}")
+        self.logger.info("Потоковый анализ завершен.")
@@ -0,0 +1,320 @@
+import json
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from typing import ContextManager, Iterator, Optional
+
+import numpy as np
+
+from tools.FileTools import ensure_parent_dir
+
+# Переменная окружения с путём к отчёту профилировщика (без расширения или с .json)
+PROFILE_ENV = 'EVIC_PROFILE'
+# Переменная окружения с интервалом семплирующего профилировщика в секундах
+PROFILE_SAMPLE_ENV = 'EVIC_PROFILE_SAMPLE'
+# Переменная окружения, включающая учёт пиковой памяти этапов через tracemalloc
+PROFILE_MEMORY_ENV = 'EVIC_PROFILE_MEMORY'
+
+# Границы корзин гистограммы времени сборки кадра в секундах: от 0.1 мс до 10 с
+FRAME_TIME_BINS = np.logspace(-4, 1, 26)
+
+
+class Profiler:
+    """
+    Сбор времени и памяти по этапам конвейера: декодирование, признаки, биты, раскладка,
+    загрузка вставок, сборка кадров, кодирование и сведение звука.
+    Для каждого кадра запоминаются время сборки и количество активных слоёв.
+    Отчёт сохраняется в JSON, временная шкала — в формате Chrome trace (chrome://tracing, Perfetto).
+    Дополнительно можно включить семплирующий профилировщик основного потока.
+
+    Выключенный профилировщик ничего не записывает, поэтому инструментированный код
+    может обращаться к нему безусловно. Записываются события только текущего процесса.
+    """
+
+    def __init__(self, enabled: bool = True, track_memory: bool = False,
+                 sample_interval: Optional[float] = None) -> None:
+        """
+        Инициализация профилировщика.
+
+        :param enabled: Записывать ли события.
+        :param track_memory: Измерять ли пиковую память этапов через tracemalloc (по умолчанию нет).
+            Учитываются выделения Python и numpy, но учёт замедляет рендер примерно в полтора раза
+            и искажает время этапов. Пиковый RSS процесса записывается в отчёт всегда.
+        :param sample_interval: Интервал семплирования стека основного потока в секундах
+            или None, чтобы не семплировать.
+        """
+        self.enabled: bool = enabled
+        self.track_memory: bool = track_memory and enabled
+        self.sample_interval: Optional[float] = sample_interval if enabled else None
+
+        self._origin: float = time.perf_counter()
+        self._stages: list[dict] = []
+        self._stack: list[dict] = []
+        self._events: list[tuple[str, int, float, float]] = []
+        self._frame_times: list[float] = []
+        self._frame_seconds: list[float] = []
+        self._frame_layers: list[int] = []
+        self._thread_names: dict[int, str] = {threading.get_ident(): 'main'}
+
+        self._samples: Counter = Counter()
+        self._sampler: Optional[threading.Thread] = None
+        self._sampling: threading.Event = threading.Event()
+
+    def start(self) -> None:
+        """
+        Запускает учёт памяти и семплирование, если они включены.
+        """
+        if self.track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if self.sample_interval and self._sampler is None:
+            self._sampling.set()
+            self._sampler = threading.Thread(target=self._sample, args=(threading.get_ident(),), daemon=True)
+            self._sampler.start()
+
+    def stop(self) -> None:
+        """
+        Останавливает учёт памяти и семплирование.
+        """
+        if self._sampler is not None:
+            self._sampling.clear()
+            self._sampler.join()
+            self._sampler = None
+        if self.track_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def stage(self, name: str, **args) -> ContextManager[None]:
+        """
+        Контекст этапа конвейера. Этапы могут быть вложенными.
+
+        :param name: Название этапа.
+        :param args: Дополнительные сведения об этапе для отчёта.
+        :return: Контекстный менеджер.
+        """
+        if not self.enabled:
+            return nullcontext()
+        return self._stage(name, args)
+
+    @contextmanager
+    def _stage(self, name: str, args: dict) -> Iterator[None]:
+        tracing = self.track_memory and tracemalloc.is_tracing()
+        if tracing:
+            # Пик родительского этапа запоминается до сброса счётчика
+            if self._stack:
+                parent = self._stack[-1]
+                parent['peak_memory'] = max(parent['peak_memory'], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        record = {'name': name, 'start': time.perf_counter() - self._origin, 'peak_memory': 0, 'args': args}
+        self._stack.append(record)
+        try:
+            yield
+        finally:
+            record['duration'] = time.perf_counter() - self._origin - record['start']
+            self._stack.pop()
+            if tracing:
+                record['peak_memory'] = max(record['peak_memory'], tracemalloc.get_traced_memory()[1])
+                if self._stack:
+                    self._stack[-1]['peak_memory'] = max(self._stack[-1]['peak_memory'], record['peak_memory'])
+                tracemalloc.reset_peak()
+            else:
+                del record['peak_memory']
+            record['depth'] = len(self._stack)
+            self._stages.append(record)
+
+    def add_frame(self, t: float, seconds: float, layers: int) -> None:
+        """
+        Записывает сборку одного кадра.
+
+        :param t: Время кадра в клипе в секундах.
+        :param seconds: Время сборки кадра в секундах.
+        :param layers: Количество активных слоёв в кадре.
+        """
+        if self.enabled:
+            self._frame_times.append(t)
+            self._frame_seconds.append(seconds)
+            self._frame_layers.append(layers)
+
+    def add_event(self, name: str, start: float, seconds: float, thread: Optional[str] = None) -> None:
+        """
+        Записывает короткое событие временной шкалы, например передачу кадра кодировщику.
+        Может вызываться из любого потока.
+
+        :param name: Название события.
+        :param start: Время начала по time.perf_counter().
+        :param seconds: Длительность в секундах.
+        :param thread: Название потока для временной шкалы.
+        """
+        if self.enabled:
+            ident = threading.get_ident()
+            if thread is not None:
+                self._thread_names.setdefault(ident, thread)
+            self._events.append((name, ident, start - self._origin, seconds))
+
+    def summary(self) -> dict:
+        """
+        Сводный отчёт: этапы, суммарное время событий, статистика и гистограммы кадров.
+
+        :return: Словарь, пригодный для сохранения в JSON.
+        """
+        totals: dict[str, dict] = {}
+        for name, _, _, seconds in self._events:
+            total = totals.setdefault(name, {'count': 0, 'seconds': 0.0})
+            total['count'] += 1
+            total['seconds'] += seconds
+
+        report = {
+            'stages': self._stages,
+            'events': totals,
+            'frames': self._frame_summary(),
+            'max_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        }
+        if self._samples:
+            report['samples'] = sum(self._samples.values())
+        return report
+
+    def _frame_summary(self) -> dict:
+        if not self._frame_seconds:
+            return {'count': 0}
+        seconds = np.array(self._frame_seconds)
+        layers = np.array(self._frame_layers)
+        counts, _ = np.histogram(np.clip(seconds, FRAME_TIME_BINS[0], FRAME_TIME_BINS[-1]), FRAME_TIME_BINS)
+        by_layers = {int(n): float(seconds[layers == n].mean()) for n in np.unique(layers)}
+        return {
+            'count': len(seconds),
+            'total': float(seconds.sum()),
+            'mean': float(seconds.mean()),
+            'p50': float(np.percentile(seconds, 50)),
+            'p95': float(np.percentile(seconds, 95)),
+            'p99': float(np.percentile(seconds, 99)),
+            'max': float(seconds.max()),
+            'slowest_time': float(self._frame_times[int(seconds.argmax())]),
+            'histogram': {'edges': FRAME_TIME_BINS.tolist(), 'counts': counts.tolist()},
+            'layers': {
+                'mean': float(layers.mean()),
+                'max': int(layers.max()),
+                'histogram': np.bincount(layers).tolist(),
+                'mean_seconds_by_count': by_layers,
+            },
+        }
+
+    def save_json(self, path: str) -> None:
+        """
+        Сохраняет сводный отчёт в JSON.
+
+        :param path: Путь к файлу.
+        """
+        _write_json(path, self.summary())
+
+    def save_chrome_trace(self, path: str) -> None:
+        """
+        Сохраняет временную шкалу в формате Chrome trace: этапы, сборка каждого кадра
+        с количеством слоёв, события других потоков и счётчик активных слоёв.
+
+        :param path: Путь к файлу.
+        """
+        pid = os.getpid()
+        main = next(iter(self._thread_names))
+        events = [{'ph': 'M', 'name': 'thread_name', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+                  for tid, name in self._thread_names.items()]
+        for stage in self._stages:
+            args = dict(stage['args'])
+            if 'peak_memory' in stage:
+                args['peak_memory'] = stage['peak_memory']
+            events.append({'ph': 'X', 'name': stage['name'], 'pid': pid, 'tid': main,
+                           'ts': stage['start'] * 1e6, 'dur': stage['duration'] * 1e6, 'args': args})
+        for name, tid, start, seconds in self._events:
+            events.append({'ph': 'X', 'name': name, 'pid': pid, 'tid': tid, 'ts': start * 1e6, 'dur': seconds * 1e6})
+        _write_json(path, {'traceEvents': events, 'displayTimeUnit': 'ms'})
+
+    def save_samples(self, path: str) -> None:
+        """
+        Сохраняет стеки семплирующего профилировщика в свёрнутом формате
+        (строка «функция;функция;... количество»), который читают flamegraph.pl и speedscope.
+
+        :param path: Путь к файлу.
+        """
+        with open(path, 'w') as f:
+            for stack, count in self._samples.most_common():
+                f.write(f'{stack} {count}\n')
+
+    def save(self, base_path: str) -> list[str]:
+        """
+        Сохраняет все отчёты рядом: base.json, base.trace.json и base.samples.txt (если было семплирование).
+
+        :param base_path: Путь к отчёту без расширения (расширение .json отбрасывается).
+        :return: Пути к записанным файлам.
+        """
+        base = base_path[:-len('.json')] if base_path.endswith('.json') else base_path
+        ensure_parent_dir(base)
+        paths = [f'{base}.json', f'{base}.trace.json']
+        self.save_json(paths[0])
+        self.save_chrome_trace(paths[1])
+        if self._samples:
+            paths.append(f'{base}.samples.txt')
+            self.save_samples(paths[2])
+        return paths
+
+    def _sample(self, ident: int) -> None:
+        while self._sampling.is_set():
+            frame = sys._current_frames().get(ident)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+                frame = frame.f_back
+            if stack:
+                self._samples[';'.join(reversed(stack))] += 1
+            time.sleep(self.sample_interval)
+
+
+def _write_json(path: str, data: dict) -> None:
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=1)
+
+
+# Текущий профилировщик процесса; по умолчанию выключен
+_profiler: Profiler = Profiler(enabled=False)
+
+
+def get_profiler() -> Profiler:
+    """
+    Текущий профилировщик процесса.
+
+    :return: Профилировщик (выключенный, если профилирование не включено).
+    """
+    return _profiler
+
+
+def set_profiler(profiler: Profiler) -> Profiler:
+    """
+    Делает профилировщик текущим для процесса и запускает его.
+
+    :param profiler: Профилировщик.
+    :return: Тот же профилировщик.
+    """
+    global _profiler
+    _profiler.stop()
+    _profiler = profiler
+    profiler.start()
+    return profiler
+
+
+def profiler_from_env() -> Optional[str]:
+    """
+    Включает профилирование, если задана переменная окружения EVIC_PROFILE.
+    Интервал семплирования берётся из EVIC_PROFILE_SAMPLE, учёт памяти этапов включается
+    непустым значением EVIC_PROFILE_MEMORY, кроме 0.
+
+    :return: Путь к отчёту из EVIC_PROFILE или None, если профилирование не включено.
+    """
+    path = os.environ.get(PROFILE_ENV)
+    if not path:
+        return None
+    interval = os.environ.get(PROFILE_SAMPLE_ENV)
+    track_memory = os.environ.get(PROFILE_MEMORY_ENV, '') not in ('', '0')
+    set_profiler(Profiler(track_memory=track_memory, sample_interval=float(interval) if interval else None))
+    return path
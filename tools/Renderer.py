@@ -0,0 +1,358 @@
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import numpy as np
+from moviepy.config import get_setting
+from moviepy.video.VideoClip import VideoClip
+
+from tools.AudioSource import AudioSource
+from tools.Compositor import Compositor
+from tools.FileTools import ensure_parent_dir
+from tools.FrameWriter import EncoderSettings, FrameWriter
+from tools.Layout import Layout
+from tools.Profiler import get_profiler
+from tools.SegmentCache import SegmentCache
+from tools.SpriteCache import SpriteCache
+
+# Компоновщик процесса-рендерера, собирается один раз при запуске процесса
+_worker_compositor: Optional[Compositor] = None
+
+
+def render_video(clip: VideoClip, output_path: str, fps: int = 24, audio: Optional[AudioSource] = None,
+                 encoder: Optional[EncoderSettings] = None) -> None:
+    """
+    Записывает клип в файл. Видео кодируется без звука, после чего исходная
+    звуковая дорожка сводится с ним без повторного декодирования.
+    Сборка кадров и кодирование идут одновременно (см. FrameWriter).
+    В потоковом режиме кодировщика звук сводится сразу при кодировании, и файл
+    можно воспроизводить, пока рендер продолжается.
+
+    :param clip: Итоговый видеоклип (без звука).
+    :param output_path: Путь к итоговому файлу.
+    :param fps: Частота кадров.
+    :param audio: Источник звука или None для видео без звука.
+    :param encoder: Параметры кодировщика (по умолчанию EncoderSettings()).
+    """
+    ensure_parent_dir(output_path)
+    times = frame_times(clip.duration, fps)
+    if audio is None or (encoder is not None and encoder.streaming):
+        write_frames(clip, output_path, times, fps, encoder, audio=audio, duration=clip.duration)
+        return
+
+    root, ext = os.path.splitext(output_path)
+    video_path = f'{root}.video{ext}'
+    try:
+        write_frames(clip, video_path, times, fps, encoder)
+        audio.mux(video_path, output_path, duration=clip.duration)
+    finally:
+        if os.path.exists(video_path):
+            os.remove(video_path)
+
+
+def render_parallel(layout: Layout, output_path: str, fps: int = 24, audio: Optional[AudioSource] = None,
+                    workers: Optional[int] = None, segments_per_worker: int = 2,
+                    encoder: Optional[EncoderSettings] = None) -> None:
+    """
+    Рендерит клип параллельно на нескольких ядрах.
+    Временная шкала делится на отрезки по кадрам, каждый отрезок кодируется отдельным
+    процессом по одной и той же раскладке, затем отрезки склеиваются без перекодирования,
+    и в конце один раз сводится звук. Кадры совпадают с render_video на той же раскладке;
+    для побитового совпадения декодированного видео используйте кодирование без потерь
+    (например, EncoderSettings(ffmpeg_params=['-qp', '0'])).
+
+    :param layout: Раскладка клипа.
+    :param output_path: Путь к итоговому файлу.
+    :param fps: Частота кадров.
+    :param audio: Источник звука или None для видео без звука.
+    :param workers: Количество процессов (по умолчанию — количество ядер).
+    :param segments_per_worker: Количество отрезков на процесс для выравнивания нагрузки.
+    :param encoder: Параметры кодировщика (по умолчанию EncoderSettings()).
+    :raises ValueError: Если включён потоковый режим кодировщика.
+    """
+    _check_not_streaming(encoder)
+    workers = workers or os.cpu_count() or 1
+    n_frames = len(frame_times(layout.duration, fps))
+    n_segments = max(1, min(n_frames, workers * segments_per_worker))
+    bounds = np.linspace(0, n_frames, n_segments + 1).astype(int)
+
+    ensure_parent_dir(output_path)
+    tmp_dir = tempfile.mkdtemp(prefix='evic_', dir=os.path.dirname(os.path.abspath(output_path)))
+    try:
+        parts = [os.path.join(tmp_dir, f'part_{i:05d}.mp4') for i in range(n_segments)]
+        tasks = [(part, int(first), int(last), fps, encoder)
+                 for part, first, last in zip(parts, bounds[:-1], bounds[1:])]
+        run_segments(layout, tasks, workers)
+        _finish(parts, output_path, tmp_dir, audio, layout.duration)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def render_incremental(layout: Layout, output_path: str, fps: int = 24, audio: Optional[AudioSource] = None,
+                       segment_cache: Optional[SegmentCache] = None, segment_duration: float = 2.0,
+                       workers: int = 1, sprite_cache: Optional[SpriteCache] = None,
+                       encoder: Optional[EncoderSettings] = None) -> int:
+    """
+    Рендерит клип с переиспользованием отрезков предыдущих рендеров.
+    Временная шкала делится на отрезки фиксированной длины; ключ отрезка строится по
+    видимым в нём слоям (см. segment_signatures). Когда меняется чувствительность или
+    случайная раскладка, заново кодируются только отрезки с изменившимися слоями,
+    остальные берутся из кэша, после чего отрезки склеиваются без перекодирования.
+
+    :param layout: Раскладка клипа.
+    :param output_path: Путь к итоговому файлу.
+    :param fps: Частота кадров.
+    :param audio: Источник звука или None для видео без звука.
+    :param segment_cache: Кэш отрезков (по умолчанию создаётся в 'cache/segments').
+    :param segment_duration: Длительность отрезка в секундах (по умолчанию 2).
+    :param workers: Количество процессов для кодирования изменившихся отрезков.
+    :param sprite_cache: Кэш вставок для рендера в текущем процессе.
+    :param encoder: Параметры кодировщика (по умолчанию EncoderSettings()).
+    :return: Количество заново закодированных отрезков.
+    :raises ValueError: Если включён потоковый режим кодировщика.
+    """
+    _check_not_streaming(encoder)
+    segment_cache = segment_cache or SegmentCache()
+    segment_frames = max(1, round(segment_duration * fps))
+    encoder = encoder or EncoderSettings()
+    signatures, bounds = segment_signatures(layout, fps, segment_frames, extra=encoder.key())
+
+    parts, tasks, keys = [], [], []
+    for key, first, last in zip(signatures, bounds[:-1], bounds[1:]):
+        cached = segment_cache.get(key)
+        if cached is None:
+            tasks.append((segment_cache.tmp_path(key), first, last, fps, encoder))
+            keys.append(key)
+            cached = segment_cache.path(key)
+        parts.append(cached)
+
+    if tasks:
+        try:
+            run_segments(layout, tasks, workers, sprite_cache)
+        except BaseException:
+            for task in tasks:
+                segment_cache.discard(task[0])
+            raise
+        for key, task in zip(keys, tasks):
+            segment_cache.put(key, task[0])
+
+    ensure_parent_dir(output_path)
+    tmp_dir = tempfile.mkdtemp(prefix='evic_', dir=os.path.dirname(os.path.abspath(output_path)))
+    try:
+        _finish(parts, output_path, tmp_dir, audio, layout.duration)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    segment_cache.evict()
+    return len(tasks)
+
+
+def segment_signatures(layout: Layout, fps: float, segment_frames: int,
+                       extra: tuple = ()) -> tuple[list[str], list[int]]:
+    """
+    Делит кадры клипа на отрезки по segment_frames кадров и строит для каждого отрезка ключ.
+    Ключ зависит от фона, всех вставок и их масштаба, зерна помех, номеров кадров отрезка и от слоёв,
+    видимых хотя бы в одном его кадре (файл вставки, начало, конец, позиция, эффекты, порядок наложения).
+    Отрезки старой и новой раскладки с одинаковым ключом выглядят одинаково.
+
+    :param layout: Раскладка клипа.
+    :param fps: Частота кадров.
+    :param segment_frames: Количество кадров в отрезке.
+    :param extra: Дополнительные параметры рендера, влияющие на результат.
+    :return: Ключи отрезков и границы отрезков в номерах кадров.
+    """
+    times = frame_times(layout.duration, fps)
+    bounds = list(range(0, len(times), segment_frames)) + [len(times)]
+    sources = [source_id(path) for path in [layout.background_path] + layout.sprite_paths]
+    # Размер каждой вставки на экране зависит от всего набора вставок, поэтому в ключ входят все файлы
+    base = repr((sources, layout.sprite_scale, layout.seed, fps, extra))
+
+    schedule = layout.schedule
+    starts, ends = schedule['start'], schedule['end']
+    max_duration = float((ends - starts).max()) if len(schedule) else 0.0
+
+    signatures = []
+    for first, last in zip(bounds[:-1], bounds[1:]):
+        t0, t1 = times[first], times[last - 1]
+        lo = np.searchsorted(starts, t0 - max_duration, side='left')
+        hi = np.searchsorted(starts, t1, side='right')
+        layers = [(sources[1 + sprite], start, end, x, y, flags)
+                  for start, end, x, y, sprite, flags in schedule[lo:hi].tolist() if end > t0]
+        description = repr((base, first, last, layers)).encode()
+        signatures.append(hashlib.blake2b(description, digest_size=20).hexdigest())
+    return signatures, bounds
+
+
+def render_preview(layout: Layout, output_path: str, scale: float = 0.25, fps: int = 12, start: float = 0.0,
+                   end: Optional[float] = None, audio: Optional[AudioSource] = None,
+                   sprite_cache: Optional[SpriteCache] = None, encoder: Optional[EncoderSettings] = None) -> None:
+    """
+    Быстро рендерит черновик клипа: уменьшенный кадр, пониженная частота кадров и быстрый
+    пресет кодировщика, при необходимости — только фрагмент [start, end).
+    Раскладка не меняется, поэтому полный рендер той же раскладки совпадает с черновиком.
+
+    :param layout: Раскладка клипа.
+    :param output_path: Путь к файлу черновика.
+    :param scale: Масштаб кадра относительно фона (по умолчанию 0.25).
+    :param fps: Частота кадров черновика (по умолчанию 12).
+    :param start: Начало фрагмента в секундах.
+    :param end: Конец фрагмента в секундах (по умолчанию — конец клипа).
+    :param audio: Источник звука или None для черновика без звука.
+    :param sprite_cache: Кэш вставок.
+    :param encoder: Параметры кодировщика (по умолчанию пресет 'ultrafast').
+    """
+    end = layout.duration if end is None else min(end, layout.duration)
+    encoder = encoder or EncoderSettings(preset='ultrafast')
+    compositor = layout.build_compositor(sprite_cache, scale=scale)
+    times = frame_times(layout.duration, fps)
+    times = times[(times >= start) & (times < end)]
+
+    ensure_parent_dir(output_path)
+    if audio is None or encoder.streaming:
+        write_frames(compositor, output_path, times, fps, encoder, audio=audio, audio_offset=start,
+                     duration=end - start)
+        return
+
+    root, ext = os.path.splitext(output_path)
+    video_path = f'{root}.video{ext}'
+    try:
+        write_frames(compositor, video_path, times, fps, encoder)
+        audio.mux(video_path, output_path, duration=end - start, offset=start)
+    finally:
+        if os.path.exists(video_path):
+            os.remove(video_path)
+
+
+def source_id(path: str) -> tuple[str, int, int]:
+    """
+    Описание входного файла для ключей и подписей: абсолютный путь, размер и время изменения.
+    Меняется при любой перезаписи файла без чтения его содержимого.
+
+    :param path: Путь к файлу.
+    :return: Путь, размер в байтах и время изменения в наносекундах.
+    """
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+
+
+def frame_times(duration: float, fps: float) -> np.ndarray:
+    """
+    Моменты времени кадров клипа. Совпадают с сеткой, по которой кадры пишет moviepy.
+
+    :param duration: Длительность клипа в секундах.
+    :param fps: Частота кадров.
+    :return: Массив моментов времени в секундах.
+    """
+    return np.arange(0, duration, 1.0 / fps)
+
+
+def write_frames(compositor: Compositor | VideoClip, path: str, times: np.ndarray, fps: float,
+                 encoder: Optional[EncoderSettings] = None, queue_depth: int = 4, audio: Optional[AudioSource] = None,
+                 audio_offset: float = 0.0, duration: Optional[float] = None) -> None:
+    """
+    Кодирует кадры в заданные моменты времени в отдельный видеофайл (по умолчанию без звука).
+    Кадры собираются в текущем потоке, пока предыдущие кадры передаются в ffmpeg.
+
+    :param compositor: Компоновщик кадров или клип.
+    :param path: Путь к видеофайлу.
+    :param times: Моменты времени кадров в секундах.
+    :param fps: Частота кадров.
+    :param encoder: Параметры кодировщика (по умолчанию EncoderSettings()).
+    :param queue_depth: Количество кадров в очереди на кодирование.
+    :param audio: Источник звука, который сводится с видео при кодировании, или None.
+    :param audio_offset: Время в аудиофайле, с которого начинается звук.
+    :param duration: Длительность результата в секундах (по умолчанию — по более короткому потоку).
+    """
+    profiler = get_profiler()
+    # Клип из Compositor.to_clip собирает кадры методом компоновщика, у него же счётчик слоёв
+    layers_source = getattr(compositor.make_frame, '__self__', compositor)
+    with profiler.stage('write_frames', path=path, frames=len(times)):
+        writer = FrameWriter(path, tuple(compositor.size), fps, encoder, queue_depth, audio, audio_offset, duration)
+        try:
+            for t in times:
+                start = time.perf_counter()
+                frame = compositor.make_frame(t)
+                if profiler.enabled:
+                    seconds = time.perf_counter() - start
+                    profiler.add_event('compose', start, seconds)
+                    profiler.add_frame(float(t), seconds, getattr(layers_source, 'layer_count', 0))
+                writer.write_frame(frame)
+        finally:
+            writer.close()
+
+
+def concat_segments(parts: list[str], output_path: str) -> None:
+    """
+    Склеивает видеофайлы отрезков в один файл без перекодирования.
+
+    :param parts: Пути к файлам отрезков в порядке следования.
+    :param output_path: Путь к итоговому файлу.
+    :raises ValueError: Если ffmpeg завершился с ошибкой.
+    """
+    list_path = f'{output_path}.txt'
+    with open(list_path, 'w') as f:
+        for part in parts:
+            f.write(f"file '{os.path.abspath(part)}'\n")
+
+    cmd = [get_setting('FFMPEG_BINARY'), '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0',
+           '-i', list_path, '-c', 'copy', output_path]
+    try:
+        with get_profiler().stage('concat', parts=len(parts)):
+            result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    finally:
+        os.remove(list_path)
+    if result.returncode != 0:
+        raise ValueError(f"Ошибка при склейке отрезков видео: {result.stderr.decode(errors='replace')}")
+
+
+def run_segments(layout: Layout, tasks: list[tuple[str, int, int, float, Optional[EncoderSettings]]], workers: int = 1,
+                 sprite_cache: Optional[SpriteCache] = None) -> None:
+    """
+    Кодирует отрезки клипа в текущем процессе или в пуле процессов.
+
+    :param layout: Раскладка клипа.
+    :param tasks: Задачи: (путь к файлу, первый кадр, кадр после последнего, частота кадров, параметры кодировщика).
+    :param workers: Количество процессов; при 1 отрезки кодируются в текущем процессе.
+    :param sprite_cache: Кэш вставок для рендера в текущем процессе.
+    """
+    if workers <= 1 or len(tasks) <= 1:
+        compositor = layout.build_compositor(sprite_cache)
+        for path, first, last, fps, encoder in tasks:
+            times = frame_times(compositor.duration, fps)[first:last]
+            write_frames(compositor, path, times, fps, encoder)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(layout,)) as pool:
+        list(pool.map(_render_segment, tasks))
+
+
+def _finish(parts: list[str], output_path: str, tmp_dir: str, audio: Optional[AudioSource],
+            duration: float) -> None:
+    if audio is None:
+        concat_segments(parts, output_path)
+        return
+    video_path = os.path.join(tmp_dir, 'video.mp4')
+    concat_segments(parts, video_path)
+    audio.mux(video_path, output_path, duration=duration)
+
+
+def _check_not_streaming(encoder: Optional[EncoderSettings]) -> None:
+    # Отрезки склеиваются только после кодирования всех, поэтому начать воспроизведение раньше нельзя
+    if encoder is not None and encoder.streaming:
+        raise ValueError("Потоковый вывод доступен только при рендере в одном процессе")
+
+
+def _init_worker(layout: Layout) -> None:
+    global _worker_compositor
+    _worker_compositor = layout.build_compositor()
+
+
+def _render_segment(task: tuple[str, int, int, float, Optional[EncoderSettings]]) -> str:
+    path, first, last, fps, encoder = task
+    times = frame_times(_worker_compositor.duration, fps)[first:last]
+    write_frames(_worker_compositor, path, times, fps, encoder)
+    return path
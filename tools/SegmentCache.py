@@ -0,0 +1,88 @@
+import os
+from typing import Optional
+
+from tools.AnalysisCache import evict_lru
+
+
+class SegmentCache:
+    """
+    Дисковый кэш закодированных отрезков видео.
+    Ключ отрезка описывает всё, что видно в его кадрах, поэтому отрезки, которые
+    не изменились между рендерами, берутся из кэша без повторного кодирования.
+    Общий размер ограничен, при превышении удаляются давно использованные отрезки (LRU).
+    """
+
+    def __init__(self, cache_dir: str = 'cache/segments', max_bytes: int = 2 * 1024 * 1024 * 1024) -> None:
+        """
+        Инициализация кэша.
+
+        :param cache_dir: Директория для хранения отрезков.
+        :param max_bytes: Максимальный суммарный размер отрезков в байтах (по умолчанию 2 ГБ).
+        """
+        self.cache_dir: str = cache_dir
+        self.max_bytes: int = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        """
+        Путь к файлу отрезка.
+
+        :param key: Ключ отрезка.
+        :return: Путь к файлу.
+        """
+        return os.path.join(self.cache_dir, f'{key}.mp4')
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Возвращает путь к готовому отрезку и отмечает его как недавно использованный.
+
+        :param key: Ключ отрезка.
+        :return: Путь к файлу или None, если отрезка нет в кэше.
+        """
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def tmp_path(self, key: str) -> str:
+        """
+        Путь для записи отрезка до его добавления в кэш. Временные файлы лежат в поддиректории tmp,
+        поэтому evict не удаляет отрезки, которые ещё записываются этим или другим процессом.
+
+        :param key: Ключ отрезка.
+        :return: Путь к временному файлу.
+        """
+        tmp_dir = os.path.join(self.cache_dir, 'tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        return os.path.join(tmp_dir, f'{key}.{os.getpid()}.mp4')
+
+    def put(self, key: str, tmp_path: str) -> str:
+        """
+        Добавляет записанный отрезок в кэш.
+
+        :param key: Ключ отрезка.
+        :param tmp_path: Путь к записанному файлу, полученный из tmp_path().
+        :return: Путь к файлу отрезка в кэше.
+        """
+        path = self.path(key)
+        os.replace(tmp_path, path)
+        return path
+
+    def discard(self, tmp_path: str) -> None:
+        """
+        Удаляет временный файл отрезка, который не удалось записать.
+
+        :param tmp_path: Путь, полученный из tmp_path().
+        """
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+
+    def evict(self) -> None:
+        """
+        Удаляет наиболее давно использованные отрезки, пока размер кэша превышает max_bytes.
+        """
+        evict_lru(self.cache_dir, self.max_bytes, '.mp4')
@@ -0,0 +1,178 @@
+import hashlib
+import json
+import os
+from typing import Optional
+
+import numpy as np
+from moviepy.video.fx.resize import resize
+from moviepy.video.VideoClip import ImageClip
+
+from tools.Profiler import get_profiler
+from tools.VideoTools import load_clip, scale_factor
+
+
+class Sprite:
+    """
+    Декодированная и масштабированная вставка: кадры RGB и альфа-канал в виде плотных массивов.
+    Все размещения одной вставки читают кадры отсюда по индексу, без повторного декодирования.
+    """
+
+    def __init__(self, frames: np.ndarray, alpha: Optional[np.ndarray], fps: Optional[float]) -> None:
+        """
+        Инициализация вставки.
+
+        :param frames: Кадры (n, h, w, 3) типа uint8.
+        :param alpha: Альфа-канал (n, h, w) типа uint8 или None для непрозрачной вставки.
+        :param fps: Частота кадров для GIF и видео или None для изображения.
+        """
+        self.frames: np.ndarray = frames
+        self.alpha: Optional[np.ndarray] = alpha
+        self.fps: Optional[float] = fps
+
+    @property
+    def size(self) -> tuple[int, int]:
+        """Размер вставки (ширина, высота)."""
+        return self.frames.shape[2], self.frames.shape[1]
+
+    @property
+    def n_frames(self) -> int:
+        """Количество кадров."""
+        return self.frames.shape[0]
+
+    def frame_index(self, t: float) -> int:
+        """
+        Номер кадра в момент t от начала показа. GIF и видео зацикливаются.
+
+        :param t: Время от начала показа вставки в секундах.
+        :return: Номер кадра.
+        """
+        if self.fps is None or self.n_frames == 1:
+            return 0
+        # Так же, как кадр выбирает FFMPEG_VideoReader в moviepy
+        index = int(self.fps * (t % (self.n_frames / self.fps)) + 0.00001)
+        return min(index, self.n_frames - 1)
+
+
+class SpriteCache:
+    """
+    Кэш декодированных вставок. Каждый файл декодируется и масштабируется один раз;
+    крупные вставки сохраняются на диск и открываются через memory-map, поэтому их кадры
+    не занимают память процесса и разделяются между процессами через страничный кэш ОС.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = 'cache/sprites', mmap_bytes: int = 64 * 1024 * 1024) -> None:
+        """
+        Инициализация кэша.
+
+        :param cache_dir: Директория для крупных вставок или None, чтобы держать всё в памяти.
+        :param mmap_bytes: Размер кадров в байтах, начиная с которого вставка хранится на диске.
+        """
+        self.cache_dir: Optional[str] = cache_dir
+        self.mmap_bytes: int = mmap_bytes
+        self._sprites: dict[tuple, Sprite] = {}
+        self._sizes: dict[str, tuple[int, int]] = {}
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def source_size(self, path: str) -> tuple[int, int]:
+        """
+        Размер исходного файла вставки (ширина, высота).
+
+        :param path: Путь к файлу.
+        :return: Ширина и высота.
+        """
+        if path not in self._sizes:
+            clip = load_clip(path)
+            self._sizes[path] = tuple(clip.size)
+            clip.close()
+        return self._sizes[path]
+
+    def load_scaled(self, base_size: tuple[int, int], paths: list[str], k: float = 1) -> list[Sprite]:
+        """
+        Загружает набор вставок с общим масштабом, как scale_clips.
+
+        :param base_size: Размер фона (ширина, высота).
+        :param paths: Пути к файлам вставок.
+        :param k: Во сколько раз большая сторона самой крупной вставки меньше стороны фона.
+        :return: Список вставок в порядке paths.
+        """
+        with get_profiler().stage('sprite_load', count=len(paths)):
+            factor = scale_factor(base_size, [self.source_size(path) for path in paths], k)
+            return [self.get(path, factor) for path in paths]
+
+    def get(self, path: str, scale: float = 1) -> Sprite:
+        """
+        Возвращает вставку, при необходимости декодируя и масштабируя её.
+
+        :param path: Путь к файлу вставки.
+        :param scale: Коэффициент масштабирования.
+        :return: Вставка.
+        """
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns, scale)
+        if key not in self._sprites:
+            self._sprites[key] = self._load_from_disk(key) or self._decode(path, scale, key)
+        return self._sprites[key]
+
+    def _disk_path(self, key: tuple) -> str:
+        digest = hashlib.blake2b(repr(key).encode(), digest_size=16).hexdigest()
+        return os.path.join(self.cache_dir, digest)
+
+    def _load_from_disk(self, key: tuple) -> Optional[Sprite]:
+        if not self.cache_dir:
+            return None
+        base = self._disk_path(key)
+        try:
+            with open(f'{base}.json') as f:
+                meta = json.load(f)
+            frames = np.load(f'{base}.frames.npy', mmap_mode='r')
+            alpha = np.load(f'{base}.alpha.npy', mmap_mode='r') if meta['has_alpha'] else None
+        except (OSError, ValueError, KeyError):
+            return None
+        return Sprite(frames, alpha, meta['fps'])
+
+    def _decode(self, path: str, scale: float, key: tuple) -> Sprite:
+        clip = load_clip(path)
+        scaled = clip.fx(resize, scale) if scale != 1 else clip
+
+        if isinstance(clip, ImageClip):
+            fps, times = None, np.zeros(1)
+        else:
+            fps = clip.fps
+            times = np.arange(0, clip.duration, 1.0 / fps)
+
+        w, h = scaled.size
+        has_alpha = scaled.mask is not None
+        frame_bytes = len(times) * h * w * (4 if has_alpha else 3)
+        on_disk = bool(self.cache_dir) and frame_bytes >= self.mmap_bytes
+
+        base = self._disk_path(key) if on_disk else None
+        tmp_suffix = f'.{os.getpid()}.tmp.npy'
+        frames = self._allocate(f'{base}.frames{tmp_suffix}' if on_disk else None, (len(times), h, w, 3))
+        alpha = self._allocate(f'{base}.alpha{tmp_suffix}' if on_disk else None, (len(times), h, w)) \
+            if has_alpha else None
+
+        # Кадры читаются строго последовательно: так чтение GIF и видео детерминировано
+        for i, t in enumerate(times):
+            frames[i] = scaled.get_frame(t)
+            if alpha is not None:
+                alpha[i] = np.round(scaled.mask.get_frame(t) * 255)
+        clip.close()
+
+        if not on_disk:
+            return Sprite(frames, alpha, fps)
+
+        frames.flush()
+        os.replace(f'{base}.frames{tmp_suffix}', f'{base}.frames.npy')
+        if alpha is not None:
+            alpha.flush()
+            os.replace(f'{base}.alpha{tmp_suffix}', f'{base}.alpha.npy')
+        with open(f'{base}.json', 'w') as f:
+            json.dump({'fps': fps, 'has_alpha': has_alpha}, f)
+        return self._load_from_disk(key)
+
+    @staticmethod
+    def _allocate(path: Optional[str], shape: tuple) -> np.ndarray:
+        if path is None:
+            return np.empty(shape, dtype=np.uint8)
+        return np.lib.format.open_memmap(path, mode='w+', dtype=np.uint8, shape=shape)
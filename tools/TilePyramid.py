@@ -0,0 +1,245 @@
+import json
+import math
+import os
+from typing import Optional
+
+import numpy as np
+
+from tools.AnalysisCache import AnalysisCache
+from tools.FileTools import ensure_parent_dir
+
+# Версия формата файла пирамиды
+TILES_VERSION = 1
+# Сигнатура в начале файла
+TILES_MAGIC = b'EVICTILE'
+# Выравнивание массивов в файле в байтах
+TILES_ALIGN = 64
+# Динамический диапазон спектрограммы в дБ, как в librosa.power_to_db(top_db=80)
+SPECTROGRAM_RANGE_DB = 80.0
+
+
+def _pool(data: np.ndarray, factor: int, reduce) -> np.ndarray:
+    # Свёртка по первой оси группами по factor строк; неполная последняя группа сворачивается отдельно
+    full = len(data) // factor * factor
+    pooled = reduce(data[:full].reshape(len(data) // factor, factor, *data.shape[1:]), axis=1)
+    if full < len(data):
+        pooled = np.concatenate((pooled, reduce(data[full:], axis=0)[None]))
+    return pooled
+
+
+def _pool_waveform(levels: np.ndarray, factor: int) -> np.ndarray:
+    return np.stack((_pool(levels[:, 0], factor, np.min), _pool(levels[:, 1], factor, np.max)), axis=1)
+
+
+class TilePyramid:
+    """
+    Многоуровневое представление трека для интерфейса: минимумы и максимумы волны и лог-мел спектрограмма
+    на нескольких масштабах. Каждый следующий уровень в factor раз грубее предыдущего.
+    Уровни хранятся в одном файле и отображаются в память, поэтому открытие файла не читает данные,
+    а запрос любого масштаба и участка трека возвращает срез не длиннее factor * width столбцов
+    независимо от длины трека.
+
+    Волна хранится как массив (n, 2) float32 с минимумом и максимумом сигнала в каждом столбце,
+    спектрограмма — как массив (n, n_mels) uint8, где 0 соответствует db_floor, а 255 — db_floor + db_range.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Открывает файл пирамиды.
+
+        :param path: Путь к файлу.
+        :raises ValueError: Если файл повреждён или записан в другой версии формата.
+        """
+        self.path: str = path
+        data = np.memmap(path, dtype=np.uint8, mode='r')
+        if len(data) < 16 or bytes(data[:8]) != TILES_MAGIC:
+            raise ValueError(f"Файл '{path}' не является пирамидой тайлов")
+        header_size = int(data[8:16].view('<u8')[0])
+        meta = json.loads(bytes(data[16:16 + header_size]))
+        if meta.get('version') != TILES_VERSION:
+            raise ValueError(f"Неподдерживаемая версия файла пирамиды: {meta.get('version')}")
+
+        self.sr: int = meta['sr']
+        self.duration: float = meta['duration']
+        self.factor: int = meta['factor']
+        # Длительность столбца нулевого уровня в секундах
+        self.wave_step: float = meta['wave_block'] / self.sr
+        self.spectrogram_step: float = meta['hop_length'] / self.sr
+        self.db_floor: float = meta['db_floor']
+        self.db_range: float = meta['db_range']
+
+        def view(entry: dict) -> np.ndarray:
+            dtype = np.dtype(entry['dtype'])
+            size = math.prod(entry['shape']) * dtype.itemsize
+            return data[entry['offset']:entry['offset'] + size].view(dtype).reshape(entry['shape'])
+
+        self.waveform_levels: list[np.ndarray] = [view(entry) for entry in meta['waveform']]
+        self.spectrogram_levels: list[np.ndarray] = [view(entry) for entry in meta['spectrogram']]
+
+    @classmethod
+    def build(cls, path: str, y: np.ndarray, sr: int, mel_db: np.ndarray, hop_length: int, wave_block: int = 64,
+              factor: int = 2, min_columns: int = 256) -> 'TilePyramid':
+        """
+        Строит пирамиду по сигналу и спектрограмме, уже вычисленным при анализе, и записывает её в файл.
+
+        :param path: Путь к файлу.
+        :param y: Моно-сигнал.
+        :param sr: Частота дискретизации сигнала.
+        :param mel_db: Лог-мел спектрограмма (n_mels, n_frames) в дБ.
+        :param hop_length: Шаг фреймов спектрограммы в отсчётах.
+        :param wave_block: Количество отсчётов сигнала в столбце нулевого уровня волны (по умолчанию 64).
+        :param factor: Во сколько раз каждый уровень грубее предыдущего (по умолчанию 2).
+        :param min_columns: Уровни добавляются, пока в уровне больше min_columns столбцов (по умолчанию 256).
+        :return: Открытая пирамида.
+        """
+        wave = np.stack((_pool(y, wave_block, np.min), _pool(y, wave_block, np.max)), axis=1)
+        waveform = [wave.astype(np.float32)]
+        while len(waveform[-1]) > min_columns:
+            waveform.append(_pool_waveform(waveform[-1], factor))
+
+        db_floor = float(mel_db.max()) - SPECTROGRAM_RANGE_DB
+        # Время по первой оси, чтобы участок трека был непрерывным куском файла
+        scaled = (mel_db.T - db_floor) * (255 / SPECTROGRAM_RANGE_DB)
+        spectrogram = [np.clip(np.rint(scaled), 0, 255).astype(np.uint8)]
+        while len(spectrogram[-1]) > min_columns:
+            spectrogram.append(_pool(spectrogram[-1], factor, np.max))
+
+        meta = {
+            'version': TILES_VERSION,
+            'sr': sr,
+            'duration': len(y) / sr,
+            'factor': factor,
+            'wave_block': wave_block,
+            'hop_length': hop_length,
+            'db_floor': db_floor,
+            'db_range': SPECTROGRAM_RANGE_DB,
+            'waveform': [],
+            'spectrogram': [],
+        }
+        # Смещения массивов зависят от длины заголовка, а заголовок содержит смещения,
+        # поэтому место под заголовок берётся по его длине с заведомо большими смещениями
+        arrays = [('waveform', level) for level in waveform] + [('spectrogram', level) for level in spectrogram]
+        for kind, level in arrays:
+            meta[kind].append({'offset': 2 ** 62, 'shape': list(level.shape), 'dtype': level.dtype.str})
+        offset = _align(16 + len(json.dumps(meta).encode()))
+        meta['waveform'], meta['spectrogram'] = [], []
+        for kind, level in arrays:
+            meta[kind].append({'offset': offset, 'shape': list(level.shape), 'dtype': level.dtype.str})
+            offset = _align(offset + level.nbytes)
+        header = json.dumps(meta).encode()
+
+        ensure_parent_dir(path)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(TILES_MAGIC + np.uint64(len(header)).astype('<u8').tobytes() + header)
+            for (_, level), entry in zip(arrays, meta['waveform'] + meta['spectrogram']):
+                f.write(b'\0' * (entry['offset'] - f.tell()))
+                f.write(np.ascontiguousarray(level).tobytes())
+        os.replace(tmp_path, path)
+        return cls(path)
+
+    def _level(self, step: float, levels: int, start: float, end: float, width: int) -> int:
+        # Самый грубый уровень, в котором на участок приходится не меньше width столбцов
+        columns = (end - start) / step
+        if columns <= width:
+            return 0
+        return min(levels - 1, int(math.log(columns / width, self.factor)))
+
+    def _viewport(self, levels: list[np.ndarray], step: float, start: float, end: float,
+                  width: int) -> tuple[float, float, np.ndarray]:
+        if end <= start or width <= 0:
+            raise ValueError("Участок трека и ширина области отрисовки должны быть положительными")
+        level = self._level(step, len(levels), start, end, width)
+        step *= self.factor ** level
+        first = max(0, int(start / step))
+        last = min(len(levels[level]), math.ceil(end / step))
+        return first * step, step, levels[level][first:max(first, last)]
+
+    def waveform(self, start: float, end: float, width: int) -> tuple[float, float, np.ndarray]:
+        """
+        Минимумы и максимумы волны на участке трека для области отрисовки шириной width пикселей.
+        Возвращается срез отображённого в память уровня от width до factor * width столбцов
+        (меньше у краёв трека и при самом подробном уровне).
+
+        :param start: Начало участка в секундах.
+        :param end: Конец участка в секундах.
+        :param width: Ширина области отрисовки в пикселях.
+        :return: Время начала первого столбца, длительность столбца в секундах и массив (n, 2) float32.
+        :raises ValueError: Если участок пустой или ширина не положительна.
+        """
+        return self._viewport(self.waveform_levels, self.wave_step, start, end, width)
+
+    def spectrogram(self, start: float, end: float, width: int) -> tuple[float, float, np.ndarray]:
+        """
+        Лог-мел спектрограмма на участке трека для области отрисовки шириной width пикселей.
+        Значения — байты, децибелы получаются как db_floor + value * db_range / 255.
+
+        :param start: Начало участка в секундах.
+        :param end: Конец участка в секундах.
+        :param width: Ширина области отрисовки в пикселях.
+        :return: Время начала первого столбца, длительность столбца в секундах и массив (n, n_mels) uint8.
+        :raises ValueError: Если участок пустой или ширина не положительна.
+        """
+        return self._viewport(self.spectrogram_levels, self.spectrogram_step, start, end, width)
+
+
+def _align(offset: int) -> int:
+    return -(-offset // TILES_ALIGN) * TILES_ALIGN
+
+
+class TileCache(AnalysisCache):
+    """
+    Дисковый кэш пирамид тайлов (см. TilePyramid). Ключи строятся так же, как у AnalysisCache,
+    по содержимому аудиофайла и параметрам анализа, с добавлением параметров пирамиды.
+    Общий размер ограничен, при превышении удаляются давно использованные пирамиды (LRU).
+    """
+
+    suffix: str = '.tiles'
+
+    def __init__(self, cache_dir: str = 'cache/tiles', max_bytes: int = 1024 * 1024 * 1024, wave_block: int = 64,
+                 factor: int = 2) -> None:
+        """
+        Инициализация кэша.
+
+        :param cache_dir: Директория для хранения пирамид.
+        :param max_bytes: Максимальный суммарный размер пирамид в байтах (по умолчанию 1 ГБ).
+        :param wave_block: Количество отсчётов сигнала в столбце нулевого уровня волны (по умолчанию 64).
+        :param factor: Во сколько раз каждый уровень грубее предыдущего (по умолчанию 2).
+        """
+        super().__init__(cache_dir, max_bytes)
+        self.wave_block: int = wave_block
+        self.factor: int = factor
+
+    def make_key(self, audio_path: str, **params) -> str:
+        return super().make_key(audio_path, tiles_version=TILES_VERSION, wave_block=self.wave_block,
+                                factor=self.factor, **params)
+
+    def load(self, key: str) -> Optional[TilePyramid]:
+        """
+        Открывает пирамиду из кэша и отмечает её как недавно использованную.
+
+        :param key: Ключ записи.
+        :return: Пирамида или None, если её нет в кэше или файл повреждён.
+        """
+        path = self._path(key)
+        try:
+            pyramid = TilePyramid(path)
+        except (OSError, ValueError):
+            return None
+        os.utime(path)
+        return pyramid
+
+    def save(self, key: str, y: np.ndarray, sr: int, mel_db: np.ndarray, hop_length: int) -> TilePyramid:
+        """
+        Строит пирамиду, сохраняет её в кэш и при необходимости вытесняет старые записи.
+
+        :param key: Ключ записи.
+        :param y: Моно-сигнал.
+        :param sr: Частота дискретизации сигнала.
+        :param mel_db: Лог-мел спектрограмма (n_mels, n_frames) в дБ.
+        :param hop_length: Шаг фреймов спектрограммы в отсчётах.
+        :return: Открытая пирамида.
+        """
+        pyramid = TilePyramid.build(self._path(key), y, sr, mel_db, hop_length, self.wave_block, self.factor)
+        self.evict()
+        return pyramid
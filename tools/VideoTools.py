@@ -1,8 +1,11 @@
 import math
+import random
 
-from moviepy.editor import VideoFileClip, ImageClip, CompositeVideoClip
-from moviepy.video.VideoClip import VideoClip
-from numpy.random import randint
+from moviepy.video.compositing.CompositeVideoClip import CompositeVideoClip
+from moviepy.video.fx.loop import loop
+from moviepy.video.fx.resize import resize
+from moviepy.video.io.VideoFileClip import VideoFileClip
+from moviepy.video.VideoClip import VideoClip, ImageClip
 
 
 def make_video(input_path: str, duration: float) -> VideoClip:
@@ -15,6 +18,23 @@ def make_video(input_path: str, duration: float) -> VideoClip:
     :param duration: Длительность выходного видео в секундах.
     :return: Объект VideoClip.
     """
+    base_clip = load_clip(input_path)
+    if isinstance(base_clip, ImageClip):
+        return base_clip.set_duration(duration)
+
+    try:
+        return loop_video_clip(base_clip, duration)
+    except Exception as e:
+        raise ValueError(f"Ошибка при обработке видео/GIF: {e}")
+
+
+def load_clip(input_path: str) -> VideoClip:
+    """
+    Открывает GIF, видео или изображение как клип без изменения длительности.
+
+    :param input_path: Путь к входному файлу (GIF, видео или изображение).
+    :return: VideoFileClip для GIF и видео или ImageClip для изображения.
+    """
 
     # Определение расширения файла
     ext = input_path.split('.')[-1].lower()
@@ -23,16 +43,12 @@ def make_video(input_path: str, duration: float) -> VideoClip:
 
     if ext in video_extensions:
         try:
-            base_clip = VideoFileClip(input_path, has_mask=False)
-            final_clip = loop_video_clip(base_clip, duration)
-            return final_clip
+            return VideoFileClip(input_path, has_mask=False)
         except Exception as e:
             raise ValueError(f"Ошибка при обработке видео/GIF: {e}")
     elif ext in image_extensions:
         try:
-            base_clip = ImageClip(input_path)
-            final_clip = base_clip.set_duration(duration)
-            return final_clip
+            return ImageClip(input_path)
         except Exception as e:
             raise ValueError(f"Ошибка при обработке изображения: {e}")
     else:
@@ -60,9 +76,6 @@ def insert_image_clip(base_clip: VideoClip, sample: ImageClip | VideoClip, pos:
     return CompositeVideoClip([base_clip, img_clip], size=base_clip.size)
 
 
-from moviepy.editor import VideoClip, ImageClip
-
-
 def scale_clips(base_clip: VideoClip, clips: list, k: float = 1) -> list:
     """
     Масштабирует набор клипов относительно фонового клипа.
@@ -77,8 +90,26 @@ def scale_clips(base_clip: VideoClip, clips: list, k: float = 1) -> list:
     :return: Список масштабированных клипов.
     """
 
+    factor = scale_factor(base_clip.size, [c.size for c in clips], k)
+
+    scaled_clips = [c.fx(resize, factor) for c in clips]
+
+    return scaled_clips
+
+
+def scale_factor(base_size: tuple[int, int], sizes: list[tuple[int, int]], k: float = 1) -> float:
+    """
+    Вычисляет общий коэффициент масштабирования для scale_clips.
+
+    :param base_size: Размер фонового клипа (ширина, высота).
+    :param sizes: Размеры масштабируемых клипов.
+    :param k: Положительное число, определяющее во сколько раз по большей стороне
+              самый большой клип должен превзойти фон.
+    :return: Коэффициент масштабирования.
+    """
+
     # Находим большую сторону фонового клипа
-    bg_w, bg_h = base_clip.size
+    bg_w, bg_h = base_size
     if bg_w > bg_h:
         max_bg_side = bg_w
         max_bg_side_index = 0
@@ -86,22 +117,18 @@ def scale_clips(base_clip: VideoClip, clips: list, k: float = 1) -> list:
         max_bg_side = bg_h
         max_bg_side_index = 1
 
-    # Наход им максимальную большую сторону среди всех клипов
+    # Находим максимальную большую сторону среди всех клипов
     max_side = 0
-    for c in clips:
-        bigger_side = c.size[max_bg_side_index]
+    for size in sizes:
+        bigger_side = size[max_bg_side_index]
         if bigger_side > max_side:
             max_side = bigger_side
 
-    scale_factor = (k * max_bg_side) / max_side
-
-    scaled_clips = [c.resize(scale_factor) for c in clips]
-
-    return scaled_clips
+    return (k * max_bg_side) / max_side
 
 
 def insert_image_clip_random(main_clip: VideoClip, sample: ImageClip | VideoClip, start: float,
-                             end: float) -> ImageClip:
+                             end: float, rng: random.Random = random) -> ImageClip:
     """
     Создаёт вставляемый клип с случайной позицией и временным интервалом.
 
@@ -109,26 +136,50 @@ def insert_image_clip_random(main_clip: VideoClip, sample: ImageClip | VideoClip
     :param sample: Вставляемый изображение или видео.
     :param start: Время начала появления клипа.
     :param end: Время окончания появления клипа.
+    :param rng: Генератор случайных чисел (по умолчанию модуль random).
     :return: Вставляемый ImageClip с установленными позицией и временем.
     """
-    boards = main_clip.size
-    sample_boards = sample.size
+    pos = random_position(main_clip.size, sample.size, rng)
+    return place_clip(sample, pos, start, end)
+
+
+def random_position(boards: tuple[int, int], sample_boards: tuple[int, int],
+                    rng: random.Random = random) -> tuple[int, int]:
+    """
+    Выбирает случайную позицию, при которой вставка целиком помещается в кадр.
+
+    :param boards: Размер кадра (ширина, высота).
+    :param sample_boards: Размер вставки (ширина, высота).
+    :param rng: Генератор случайных чисел (по умолчанию модуль random).
+    :return: Координаты X и Y верхнего левого угла вставки.
+    """
     allowed_pos = (boards[0] - sample_boards[0], boards[1] - sample_boards[1])
     if allowed_pos[0] < 0 or allowed_pos[1] < 0:
         raise ValueError("Невозможно вместить клип", allowed_pos)
 
-    pos = (randint(0, allowed_pos[0] + 1), randint(0, allowed_pos[1] + 1))
+    return rng.randint(0, allowed_pos[0]), rng.randint(0, allowed_pos[1])
+
+
+def place_clip(sample: ImageClip | VideoClip, pos: tuple[int, int], start: float, end: float) -> VideoClip:
+    """
+    Создаёт вставляемый клип с заданной позицией и временным интервалом.
+
+    :param sample: Вставляемое изображение или видео.
+    :param pos: Координаты X и Y верхнего левого угла.
+    :param start: Время начала появления клипа.
+    :param end: Время окончания появления клипа.
+    :return: Вставляемый клип с установленными позицией и временем.
+    """
     duration = end - start
 
     if not isinstance(sample, ImageClip):
         sample = loop_video_clip(sample, duration)
 
-    img_clip = sample.set_position(pos).set_start(start).set_duration(duration)
-    return img_clip
+    return sample.set_position(pos).set_start(start).set_duration(duration)
 
 
 def loop_video_clip(clip: VideoClip, duration: float) -> VideoClip:
     clip_duration = clip.duration
     repeats = math.ceil(duration / clip_duration)
-    looped_clip = clip.loop(n=repeats)
+    looped_clip = clip.fx(loop, n=repeats)
     return looped_clip.subclip(0, duration)